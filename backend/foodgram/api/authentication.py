@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from copy import copy
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api.cache import get_cache, is_shared
+
+
+class LRUCache:
+    '''Ограниченный по размеру кэш процесса с временем жизни записей'''
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = LRUCache(getattr(settings, 'TOKEN_CACHE_SIZE', 1024),
+                       getattr(settings, 'TOKEN_LOCAL_CACHE_TIMEOUT', 5))
+
+
+def token_cache_key(key):
+    '''В общем кэше хранится хэш токена, а не сам токен'''
+    return f'auth:token:{sha256(key.encode()).hexdigest()}'
+
+
+def invalidate_token(key):
+    token_cache.delete(key)
+    cache = get_cache()
+    if is_shared(cache):
+        cache.delete(token_cache_key(key))
+
+
+def field_values(instance, exclude=()):
+    return {field.attname: getattr(instance, field.attname)
+            for field in instance._meta.concrete_fields
+            if field.attname not in exclude}
+
+
+def pack(user, token):
+    '''Запись общего кэша: поля пользователя без хэша пароля и токена'''
+    return field_values(user, exclude=('password',)), field_values(token)
+
+
+def unpack(entry):
+    '''
+    Пользователь и токен из записи общего кэша. Пароль остается
+    отложенным полем: при обращении он загрузится из базы,
+    а save() его не перезапишет.
+    '''
+    user_values, token_values = entry
+    user = get_user_model().from_db(DEFAULT_DB_ALIAS, list(user_values),
+                                    list(user_values.values()))
+    token = Token.from_db(DEFAULT_DB_ALIAS, list(token_values),
+                          list(token_values.values()))
+    token.user = user
+    return user, token
+
+
+def invalidate_user_tokens(user):
+    for key in Token.objects.filter(user=user).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''
+    TokenAuthentication без запроса Token join User на каждый вызов API.
+    Пользователь ищется сначала в LRU процесса, затем в общем кэше, если
+    он общий для воркеров (REDIS_URL). Записи удаляются сигналами при
+    выходе, смене пароля и деактивации. Другие воркеры узнают об этом
+    не позже TOKEN_LOCAL_CACHE_TIMEOUT.
+    '''
+
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        if entry is None:
+            entry = self.shared_credentials(key)
+            token_cache.set(key, entry)
+        user, token = entry
+        return copy(user), token
+
+    def shared_credentials(self, key):
+        cache = get_cache()
+        if not is_shared(cache):
+            # Иначе отозванный токен жил бы в других воркерах
+            # до TOKEN_CACHE_TIMEOUT
+            return super().authenticate_credentials(key)
+        cache_key = token_cache_key(key)
+        entry = cache.get(cache_key)
+        if entry is not None:
+            return unpack(entry)
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, pack(user, token),
+                  getattr(settings, 'TOKEN_CACHE_TIMEOUT', 300))
+        return user, token
@@ -0,0 +1,92 @@
+import json
+from hashlib import md5, sha1
+from time import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_cache():
+    return caches[getattr(settings, 'REFERENCE_CACHE_ALIAS', 'default')]
+
+
+def is_shared(cache):
+    '''
+    Виден ли кэш всем воркерам. LocMemCache живет в памяти процесса,
+    общий кэш включается переменной REDIS_URL.
+    '''
+    return not isinstance(cache, LocMemCache)
+
+
+def version_key(model):
+    return f'reference:{model._meta.label_lower}:version'
+
+
+def get_version(model):
+    '''
+    Текущая версия данных модели. Начальное значение берется из времени,
+    чтобы после вытеснения ключа версии не повторялись.
+    '''
+    cache = get_cache()
+    key = version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time() * 1000), None)
+        return cache.get(key)
+    return version
+
+
+def bump_version(model):
+    '''Увеличивает версию данных модели и возвращает новое значение'''
+    cache = get_cache()
+    try:
+        return cache.incr(version_key(model))
+    except ValueError:
+        return get_version(model)
+
+
+class VersionedCacheMixin:
+    '''
+    Кэширует ответы list и retrieve до изменения модели
+    и отдает строгий ETag, по которому браузер получает 304.
+    '''
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve,
+                                    request, *args, **kwargs)
+
+    def get_cache_timeout(self):
+        return getattr(settings, 'REFERENCE_CACHE_TIMEOUT', 3600)
+
+    def cached_response(self, view, request, *args, **kwargs):
+        cache = get_cache()
+        version = get_version(self.queryset.model)
+        path = md5(request.get_full_path().encode()).hexdigest()
+        key = f'reference:{self.basename}:{version}:{path}'
+        entry = cache.get(key)
+        if entry is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = json.dumps(response.data, cls=DjangoJSONEncoder,
+                                 sort_keys=True)
+            entry = (response.data, f'"{sha1(content.encode()).hexdigest()}"')
+            cache.set(key, entry, self.get_cache_timeout())
+        data, etag = entry
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ('Accept',))
+        return response
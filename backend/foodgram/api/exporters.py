@@ -0,0 +1,170 @@
+import csv
+import json
+
+SHOP_LIST = 'Список покупок:'
+FILE = 'shopping_list'
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    '''Псевдобуфер для csv.writer, возвращающий записанную строку'''
+
+    def write(self, value):
+        return value
+
+
+class TextExporter:
+    '''Список покупок в виде текстового файла'''
+
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def render(self, ingredients):
+        yield SHOP_LIST + '\n'
+        for ingredient in ingredients:
+            yield f'{format_line(ingredient)}\n'
+
+
+class CSVExporter:
+    '''Список покупок в формате CSV'''
+
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def render(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['amount'],
+            ))
+
+
+class JSONExporter:
+    '''Список покупок в формате JSON'''
+
+    content_type = 'application/json'
+    extension = 'json'
+
+    def render(self, ingredients):
+        yield '['
+        separator = ''
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+                'amount': ingredient['amount'],
+            }, ensure_ascii=False)
+            separator = ','
+        yield ']'
+
+
+class PDFExporter:
+    '''
+    Список покупок в формате PDF. Документ собирается вручную и отдается
+    постранично: каждая страница уходит клиенту, как только заполнена,
+    а таблица xref и дерево страниц дописываются в конце.
+    Кириллица выводится шрифтом Helvetica с кодировкой cp1251
+    через /Differences, шрифт в файл не встраивается.
+    '''
+
+    content_type = 'application/pdf'
+    extension = 'pdf'
+    width, height = 595, 842
+    margin = 50
+    font_size = 11
+    leading = 15
+    # Объекты 1-3 (каталог, дерево страниц, шрифт) зарезервированы
+    first_page_object = 4
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+
+    def lines_per_page(self):
+        return (self.height - 2 * self.margin) // self.leading
+
+    @staticmethod
+    def encoding():
+        # Имена глифов Adobe для А-Я и а-я, Ё и ё идут отдельно
+        codes = [*range(10017, 10023), *range(10024, 10050),
+                 *range(10065, 10071), *range(10072, 10098)]
+        glyphs = ' '.join(f'/afii{code}' for code in codes)
+        return ('<< /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+                f'/Differences [168 /afii10023 184 /afii10071 '
+                f'192 {glyphs}] >>')
+
+    @staticmethod
+    def escape(text):
+        data = text.encode('cp1251', errors='replace')
+        return (data.replace(b'\\', b'\\\\').replace(b'(', b'\\(')
+                .replace(b')', b'\\)'))
+
+    def chunk(self, data):
+        self.offset += len(data)
+        return data
+
+    def obj(self, number, body):
+        self.offsets[number] = self.offset
+        return self.chunk(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+
+    def page(self, number, lines):
+        stream = b''.join(
+            [b'BT /F1 %d Tf %d TL %d %d Td\n' % (
+                self.font_size, self.leading,
+                self.margin, self.height - self.margin)]
+            + [b'(' + self.escape(line) + b') Tj T*\n' for line in lines]
+            + [b'ET']
+        )
+        content = self.obj(number, b'<< /Length %d >>\nstream\n%s\n'
+                           b'endstream' % (len(stream), stream))
+        page = self.obj(number + 1, (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>'
+            % (self.width, self.height, number)))
+        return content + page
+
+    def pages(self, ingredients):
+        lines = [SHOP_LIST]
+        for ingredient in ingredients:
+            lines.append(format_line(ingredient))
+            if len(lines) == self.lines_per_page():
+                yield lines
+                lines = []
+        if lines:
+            yield lines
+
+    def render(self, ingredients):
+        yield self.chunk(b'%PDF-1.4\n')
+        yield self.obj(3, (b'<< /Type /Font /Subtype /Type1 '
+                           b'/BaseFont /Helvetica /Encoding '
+                           + self.encoding().encode() + b' >>'))
+        number = self.first_page_object
+        kids = []
+        for lines in self.pages(ingredients):
+            yield self.page(number, lines)
+            kids.append(b'%d 0 R' % (number + 1))
+            number += 2
+        yield self.obj(2, b'<< /Type /Pages /Kids [%s] /Count %d >>'
+                       % (b' '.join(kids), len(kids)))
+        yield self.obj(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        xref = self.offset
+        entries = [b'0000000000 65535 f \n'] + [
+            b'%010d 00000 n \n' % self.offsets[key] for key in range(1, number)
+        ]
+        yield (b'xref\n0 %d\n' % number + b''.join(entries)
+               + b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n'
+               b'%%%%EOF\n' % (number, xref))
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (TextExporter, CSVExporter, JSONExporter, PDFExporter)
+}
+
+
+def format_line(ingredient):
+    return (f'{ingredient["ingredient__name"]} - {ingredient["amount"]}/'
+            f'{ingredient["ingredient__measurement_unit"]}')
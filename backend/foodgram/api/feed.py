@@ -0,0 +1,116 @@
+import heapq
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+
+def fanout_limit():
+    '''Число подписчиков, с которого рецепты автора не рассылаются'''
+    return getattr(settings, 'FEED_FANOUT_MAX_FOLLOWERS', 1000)
+
+
+def is_prolific(author_id):
+    '''
+    Плодовитый автор: запись в ленты всех подписчиков обходится дороже,
+    чем чтение его рецептов при показе ленты
+    '''
+    return User.objects.filter(
+        pk=author_id, followers_count__gte=fanout_limit()).exists()
+
+
+def publish(recipe, batch_size=1000):
+    '''Записывает новый рецепт в ленты подписчиков автора'''
+    if is_prolific(recipe.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=recipe.author_id).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user_id, recipe_id=recipe.pk,
+                   author_id=recipe.author_id, date=recipe.date)
+         for user_id in followers],
+        batch_size=batch_size, ignore_conflicts=True)
+
+
+def backfill(user, author, batch_size=1000):
+    '''Добавляет в ленту последние рецепты автора после подписки'''
+    if is_prolific(author.pk):
+        return
+    recipes = (Recipe.objects.filter(author=author)
+               .order_by('-date', '-id').values_list('id', 'date')
+               [:getattr(settings, 'FEED_BACKFILL', 50)])
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user.pk, recipe_id=recipe_id,
+                   author_id=author.pk, date=date)
+         for recipe_id, date in recipes],
+        batch_size=batch_size, ignore_conflicts=True)
+
+
+def prune(user, author):
+    '''Убирает рецепты автора из ленты после отписки'''
+    FeedEntry.objects.filter(user=user, author=author).delete()
+
+
+def timeline(user, after, limit):
+    '''
+    Пары (date, id) рецептов ленты после позиции after по убыванию.
+    Записи FeedEntry сливаются с рецептами плодовитых авторов, которые
+    читаются при показе ленты. Рецепты, опубликованные, пока автор был
+    плодовитым, вернутся в ленты после rebuild_feed.
+    '''
+    entries = FeedEntry.objects.filter(user=user)
+    recipes = Recipe.objects.filter(author__in=Follow.objects.filter(
+        user=user, author__followers_count__gte=fanout_limit(),
+    ).values('author_id'))
+    if after is not None:
+        date, pk = after
+        entries = entries.filter(
+            Q(date__lt=date) | Q(date=date, recipe_id__lt=pk))
+        recipes = recipes.filter(Q(date__lt=date) | Q(date=date, pk__lt=pk))
+    rows = heapq.merge(
+        entries.order_by('-date', '-recipe_id')
+        .values_list('date', 'recipe_id')[:limit],
+        recipes.order_by('-date', '-id').values_list('date', 'id')[:limit],
+        reverse=True)
+    page, seen = [], set()
+    for date, pk in rows:
+        # Рецепт мог попасть в ленту, пока автор не был плодовитым
+        if pk in seen:
+            continue
+        seen.add(pk)
+        page.append((date, pk))
+        if len(page) == limit:
+            break
+    return page
+
+
+@transaction.atomic
+def rebuild_feeds(batch_size=1000):
+    '''
+    Убирает из лент рецепты авторов без подписки и дописывает последние
+    рецепты неплодовитых авторов, которых в лентах не хватает
+    '''
+    removed, _ = FeedEntry.objects.filter(~Exists(Follow.objects.filter(
+        user=OuterRef('user'), author=OuterRef('author')))).delete()
+    total = FeedEntry.objects.count()
+    authors = (User.objects.filter(followers_count__gt=0,
+                                   followers_count__lt=fanout_limit())
+               .order_by('pk').values_list('pk', flat=True))
+    for author_id in authors:
+        recipes = list(
+            Recipe.objects.filter(author_id=author_id)
+            .order_by('-date', '-id').values_list('id', 'date')
+            [:getattr(settings, 'FEED_BACKFILL', 50)])
+        if not recipes:
+            continue
+        followers = Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True)
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                       author_id=author_id, date=date)
+             for user_id in followers for recipe_id, date in recipes],
+            batch_size=batch_size, ignore_conflicts=True)
+    return removed, FeedEntry.objects.count() - total
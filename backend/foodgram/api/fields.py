@@ -1,15 +1,41 @@
 import base64
+import binascii
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files import File
 from rest_framework import serializers
 
+CHUNK_SIZE = 64 * 1024
+
+
+def decode_base64(data, max_size):
+    '''
+    Декодирует base64 частями во временный файл. Слишком большие
+    данные отклоняются до декодирования по длине строки.
+    '''
+    if len(data) * 3 // 4 > max_size:
+        raise serializers.ValidationError(
+            f'Размер изображения не должен превышать {max_size} байт.')
+    file = SpooledTemporaryFile(max_size=1024 * 1024)
+    try:
+        for start in range(0, len(data), CHUNK_SIZE):
+            file.write(base64.b64decode(data[start:start + CHUNK_SIZE],
+                                        validate=True))
+    except binascii.Error:
+        file.close()
+        raise serializers.ValidationError('Некорректные данные base64.')
+    file.seek(0)
+    return file
+
 
 class Base64ImageField(serializers.ImageField):
     """Кастомный сериализатор поля для фото рецепта"""
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
+            format, imgstr = data.strip().split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            max_size = getattr(settings, 'MAX_IMAGE_SIZE', 5 * 1024 * 1024)
+            data = File(decode_base64(imgstr, max_size), name='temp.' + ext)
         return super().to_internal_value(data)
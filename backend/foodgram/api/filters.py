@@ -1,27 +1,35 @@
 from django.contrib.auth import get_user_model
 from django_filters import rest_framework
-from rest_framework.filters import SearchFilter
+from rest_framework.exceptions import ValidationError
 
+from api.search import rank_by_ingredients, search_recipes
 from recipes.models import Recipe
 
 
 User = get_user_model()
 
-
-class NameSearchFilter(SearchFilter):
-    search_param = 'name'
+ORDERINGS = {
+    'popular': ('-score', '-date', '-id'),
+    'newest': ('-date', '-id'),
+    'quickest': ('cooking_time', '-date', '-id'),
+}
 
 
 class RecipeFilter(rest_framework.FilterSet):
     author = rest_framework.ModelChoiceFilter(queryset=User.objects.all())
     tags = rest_framework.AllValuesMultipleFilter(field_name='tags__slug')
+    search = rest_framework.CharFilter(method='filter_search')
+    have = rest_framework.CharFilter(method='filter_have')
     is_favorited = rest_framework.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = rest_framework.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    ordering = rest_framework.ChoiceFilter(
+        choices=[(key, key) for key in ORDERINGS], method='filter_ordering')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'search', 'have', 'is_favorited',
+                  'is_in_shopping_cart', 'ordering')
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -32,3 +40,16 @@ class RecipeFilter(rest_framework.FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_have(self, queryset, name, value):
+        ids = [item.strip() for item in value.split(',') if item.strip()]
+        if not all(item.isdigit() for item in ids):
+            raise ValidationError(
+                {'have': 'Укажите id ингредиентов через запятую.'})
+        return rank_by_ingredients(queryset, map(int, ids))
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
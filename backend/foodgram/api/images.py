@@ -0,0 +1,101 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from recipes.models import ImageBlob
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    'thumbnail': (480, 480),
+    'detail': (1280, 1280),
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=max(getattr(settings, 'IMAGE_WORKERS', 2), 1),
+    thread_name_prefix='images')
+
+
+def variant_name(name, variant):
+    root, _ = os.path.splitext(name)
+    return f'{root}_{variant}.jpg'
+
+
+def make_variants(name, storage=default_storage):
+    '''Создает уменьшенные копии изображения рядом с оригиналом'''
+    if all(storage.exists(variant_name(name, variant))
+           for variant in VARIANTS):
+        return
+    try:
+        with storage.open(name) as file, Image.open(file) as original:
+            original = ImageOps.exif_transpose(original).convert('RGB')
+            for variant, size in VARIANTS.items():
+                image = original.copy()
+                image.thumbnail(size)
+                buffer = io.BytesIO()
+                image.save(buffer, 'JPEG', quality=85, optimize=True)
+                target = variant_name(name, variant)
+                if storage.exists(target):
+                    storage.delete(target)
+                storage.save(target, ContentFile(buffer.getvalue()))
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+
+
+def schedule_variants(name):
+    '''
+    Ставит обработку в пул после фиксации транзакции.
+    При IMAGE_WORKERS = 0 обрабатывает сразу.
+    '''
+    if not getattr(settings, 'IMAGE_WORKERS', 2):
+        transaction.on_commit(lambda: make_variants(name))
+    else:
+        transaction.on_commit(lambda: executor.submit(make_variants, name))
+
+
+def variant_urls(image, request=None):
+    '''
+    Ссылки на оригинал и уменьшенные копии. Копии может еще не быть:
+    обработка идет в фоне, могла упасть или фото загружено раньше, чем
+    появились копии. Тогда вместо нее отдается ссылка на оригинал.
+    '''
+    if not image:
+        return None
+    urls = {'original': image.url}
+    for variant in VARIANTS:
+        name = variant_name(image.name, variant)
+        urls[variant] = (image.storage.url(name)
+                         if image.storage.exists(name) else urls['original'])
+    if request is not None:
+        urls = {key: request.build_absolute_uri(url)
+                for key, url in urls.items()}
+    return urls
+
+
+def retain(name):
+    '''Увеличивает счетчик ссылок на файл изображения'''
+    if not name:
+        return
+    ImageBlob.objects.get_or_create(name=name)
+    ImageBlob.objects.filter(name=name).update(
+        refcount=F('refcount') + 1, updated=timezone.now())
+
+
+def release(name):
+    '''
+    Уменьшает счетчик ссылок. Файлы с нулевым счетчиком удаляет
+    команда sweep_media, когда истечет ее --grace.
+    '''
+    if not name:
+        return
+    ImageBlob.objects.filter(name=name, refcount__gt=0).update(
+        refcount=F('refcount') - 1, updated=timezone.now())
@@ -0,0 +1,188 @@
+import json
+import logging
+import platform
+import random
+import subprocess
+from statistics import mean, quantiles
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentiles(timings):
+    '''Перцентили в миллисекундах'''
+    cuts = quantiles(timings, n=100, method='inclusive')
+    return {f'p{p}': round(cuts[p - 1] * 1000, 3) for p in PERCENTILES}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'), cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    '''
+    Замеры основных эндпоинтов через тестовый клиент Django.
+    Сначала заполнить базу: python manage.py seed_load
+    Выполнить команду python manage.py benchmark --output before.json
+    После изменений сравнить:
+    python manage.py benchmark --output after.json --compare before.json
+    '''
+
+    help = 'Замеры времени ответа и числа SQL-запросов основных эндпоинтов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--only', nargs='+', metavar='NAME',
+                            help='Запустить только указанные сценарии')
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+        parser.add_argument('--compare', metavar='PATH',
+                            help='JSON предыдущего запуска для сравнения')
+
+    def scenarios(self):
+        '''Имя сценария и функция, выдающая URL очередного запроса'''
+        rng = self.rng
+        recipes = list(Recipe.objects.values_list('id', flat=True)[:1000])
+        tags = list(Tag.objects.values_list('slug', flat=True))
+        names = list(Ingredient.objects.values_list('name', flat=True)[:1000])
+        if not recipes or not tags or not names:
+            raise CommandError('База пуста, сначала запустите seed_load')
+        return {
+            'recipes-list': lambda: '/api/recipes/',
+            'recipes-list-page': lambda: (
+                f'/api/recipes/?page={rng.randint(1, 20)}&limit=24'),
+            'recipes-detail': lambda: f'/api/recipes/{rng.choice(recipes)}/',
+            'recipes-filter-tags': lambda: '/api/recipes/?' + '&'.join(
+                f'tags={tag}' for tag in rng.sample(tags, 2)),
+            'recipes-favorited': lambda: '/api/recipes/?is_favorited=1',
+            'subscriptions': lambda: (
+                '/api/users/subscriptions/?recipes_limit=3'),
+            'download-shopping-cart': lambda: (
+                '/api/recipes/download_shopping_cart/'),
+            'ingredients-search': lambda: (
+                f'/api/ingredients/?name={rng.choice(names)[:3]}'),
+        }
+
+    def client(self):
+        '''Клиент пользователя с наибольшим числом подписок'''
+        user = (User.objects.annotate(follows=Count('follower'))
+                .order_by('-follows', 'pk').first())
+        if user is None:
+            raise CommandError('Нет пользователей, сначала запустите '
+                               'seed_load')
+        token, _ = Token.objects.get_or_create(user=user)
+        return Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def request(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            started = perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f'{url}: ответ {response.status_code}')
+        return elapsed, len(queries)
+
+    def measure(self, client, next_url, options):
+        for _ in range(options['warmup']):
+            self.request(client, next_url())
+        timings, counts = [], []
+        for _ in range(options['iterations']):
+            elapsed, count = self.request(client, next_url())
+            timings.append(elapsed)
+            counts.append(count)
+        return {
+            **percentiles(timings),
+            'mean': round(mean(timings) * 1000, 3),
+            'queries': max(counts),
+            'queries_min': min(counts),
+        }
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError('Нужно хотя бы 2 итерации')
+        self.rng = random.Random(options['seed'])
+        scenarios = self.scenarios()
+        unknown = set(options['only'] or ()) - set(scenarios)
+        if unknown:
+            raise CommandError(f'Неизвестные сценарии: {", ".join(unknown)}. '
+                               f'Доступны: {", ".join(scenarios)}')
+        results = {}
+        requests_logger = logging.getLogger('api.requests')
+        level = requests_logger.level
+        requests_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver'], DEBUG=False):
+                client = self.client()
+                for name, next_url in scenarios.items():
+                    if options['only'] and name not in options['only']:
+                        continue
+                    results[name] = self.measure(client, next_url, options)
+                    self.report(name, results[name])
+        finally:
+            requests_logger.setLevel(level)
+        if options['compare']:
+            self.compare(results, options['compare'])
+        if options['output']:
+            self.save(results, options)
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<24} ' + ' '.join(
+                f'{key}={result[key]:>8.2f}' for key in
+                (*(f'p{p}' for p in PERCENTILES), 'mean'))
+            + f'  queries={result["queries"]}')
+
+    def compare(self, results, path):
+        with open(path, encoding='utf-8') as file:
+            previous = json.load(file)
+        self.stdout.write(f'Сравнение с {previous.get("commit")} '
+                          f'({previous.get("created")}):')
+        for name, result in results.items():
+            before = previous['results'].get(name)
+            if before is None:
+                continue
+            change = (result['p50'] - before['p50']) / before['p50'] * 100
+            style = self.style.SUCCESS if change <= 0 else self.style.WARNING
+            self.stdout.write(style(
+                f'{name:<24} p50 {before["p50"]:.2f} -> {result["p50"]:.2f} '
+                f'мс ({change:+.1f}%), запросов {before["queries"]} -> '
+                f'{result["queries"]}'))
+
+    def save(self, results, options):
+        data = {
+            'commit': git_commit(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'iterations': options['iterations'],
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты сохранены в {options["output"]}'))
@@ -0,0 +1,73 @@
+from io import BytesIO
+from statistics import median
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import FastJSONParser, FastJSONRenderer, orjson
+from api.serializers import RecipeGetSerializer
+from recipes.models import Recipe
+from users.models import User
+
+
+def timed(func, repeat):
+    '''Медиана времени одного вызова в миллисекундах'''
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        func()
+        timings.append(perf_counter() - started)
+    return median(timings) * 1000
+
+
+class Command(BaseCommand):
+    '''
+    Сравнение стандартных JSONRenderer и JSONParser с вариантами на orjson
+    на страницах RecipeGetSerializer.
+    Выполнить команду python manage.py benchmark_json --page-size 6 100
+    '''
+
+    help = 'Замер рендеринга и разбора JSON на страницах рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, nargs='+',
+                            default=(6, 24, 100))
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson не установлен, FastJSONRenderer работает '
+                'как стандартный'))
+        request = RequestFactory().get('/api/recipes/')
+        request.user = User.objects.order_by('pk').first()
+        if request.user is None:
+            raise CommandError('База пуста, сначала запустите seed_load')
+        for size in options['page_size']:
+            recipes = (Recipe.objects.with_related(request.user)
+                       .with_user_flags(request.user)[:size])
+            data = RecipeGetSerializer(recipes, many=True,
+                                       context={'request': request}).data
+            context = {'request': request}
+            content = JSONRenderer().render(data, renderer_context=context)
+            fast = FastJSONRenderer().render(data, renderer_context=context)
+            if JSONParser().parse(BytesIO(content)) != (
+                    FastJSONParser().parse(BytesIO(fast))):
+                raise CommandError('Результаты рендеринга расходятся')
+            rows = (
+                ('render', JSONRenderer(), FastJSONRenderer(),
+                 lambda renderer: renderer.render(
+                     data, renderer_context=context)),
+                ('parse', JSONParser(), FastJSONParser(),
+                 lambda parser: parser.parse(BytesIO(content))),
+            )
+            for name, default, faster, run in rows:
+                before = timed(lambda: run(default), options['repeat'])
+                after = timed(lambda: run(faster), options['repeat'])
+                self.stdout.write(
+                    f'{name:<7} {len(data):>4} рецептов, {len(content):>8} '
+                    f'байт: json {before:8.3f} мс, orjson {after:8.3f} мс, '
+                    f'x{before / after:.1f}')
@@ -0,0 +1,77 @@
+import random
+from statistics import mean, quantiles
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+
+from api.similar import load_features, similar_recipe_ids
+from recipes.models import Recipe
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def exact_similar(recipe_id, limit):
+    '''Полный перебор: коэффициент Жаккара со всеми рецептами'''
+    items = load_features(list(Recipe.objects.values_list('pk', flat=True)))
+    target = items.pop(recipe_id)
+    scored = sorted(((jaccard(target, other), pk)
+                     for pk, other in items.items()), reverse=True)
+    return [pk for _, pk in scored[:limit]], items, target
+
+
+def p95(timings):
+    return quantiles(timings, n=20, method='inclusive')[-1] * 1000
+
+
+class Command(BaseCommand):
+    '''
+    Сравнение поиска похожих рецептов через LSH с полным перебором:
+    время ответа и качество выдачи.
+    Сначала заполнить базу: python manage.py seed_load --users 1000
+    и выполнить python manage.py rebuild_similar
+    '''
+
+    help = 'Замер поиска похожих рецептов: LSH против полного перебора'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        ids = list(Recipe.objects.values_list('pk', flat=True))
+        if len(ids) < 2:
+            raise CommandError('Мало рецептов, сначала запустите seed_load')
+        limit = options['limit']
+        sample = random.Random(options['seed']).sample(
+            ids, min(options['samples'], len(ids)))
+        lsh_times, exact_times, recall, quality = [], [], [], []
+        for recipe_id in sample:
+            started = perf_counter()
+            found = similar_recipe_ids(recipe_id, limit)
+            lsh_times.append(perf_counter() - started)
+
+            started = perf_counter()
+            best, items, target = exact_similar(recipe_id, limit)
+            exact_times.append(perf_counter() - started)
+
+            recall.append(len(set(found) & set(best)) / limit)
+            best_score = sum(jaccard(target, items[pk]) for pk in best)
+            found_score = sum(jaccard(target, items[pk]) for pk in found)
+            quality.append(found_score / best_score if best_score else 1.0)
+        self.stdout.write(
+            f'Рецептов: {len(ids)}, запросов: {len(sample)}, top-{limit}')
+        self.stdout.write(
+            f'LSH:      mean {mean(lsh_times) * 1000:8.2f} мс, '
+            f'p95 {p95(lsh_times):8.2f} мс')
+        self.stdout.write(
+            f'Перебор:  mean {mean(exact_times) * 1000:8.2f} мс, '
+            f'p95 {p95(exact_times):8.2f} мс')
+        self.stdout.write(self.style.SUCCESS(
+            f'Ускорение x{mean(exact_times) / mean(lsh_times):.1f}, '
+            f'recall@{limit} {mean(recall):.2f}, '
+            f'сумма сходства от лучшей {mean(quality):.2f}'))
@@ -1,26 +1,125 @@
+import csv
 import json
+import os
+from itertools import islice
+from time import perf_counter
 
-from django.core.management import BaseCommand
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
-from recipes.models import Ingredient
+from api.cache import bump_version
+from recipes.models import Ingredient, Tag
+
+DATA_DIR = os.path.join(settings.BASE_DIR, 'data')
+READ_SIZE = 64 * 1024
+
+MODELS = {
+    'ingredients': {
+        'model': Ingredient,
+        'fields': ('name', 'measurement_unit'),
+        'unique_fields': ('name', 'measurement_unit'),
+        'update_fields': (),
+    },
+    'tags': {
+        'model': Tag,
+        'fields': ('name', 'color', 'slug'),
+        'unique_fields': ('slug',),
+        'update_fields': ('name', 'color'),
+    },
+}
+
+
+def read_json(file):
+    '''Потоково читает объекты из JSON-массива, не загружая файл целиком'''
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив объектов.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('Файл JSON оборван.')
+            buffer += chunk
+            continue
+        yield obj
+        buffer = buffer[end:]
+
+
+def read_csv(file, fields):
+    for row in csv.reader(file):
+        if row:
+            yield dict(zip(fields, row))
 
 
 class Command(BaseCommand):
     '''
-    Импорт данных модели Ingredient.
+    Импорт данных моделей Ingredient и Tag.
     Выполнить миграции.
     Выполнить команду python manage.py import_db
+    Повторный запуск не создает дубликатов.
     '''
 
-    help = 'Импорт данных из файла ingredients.json'
+    help = 'Импорт данных из файлов CSV или JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join(DATA_DIR, 'ingredients.json'),
+            help='Путь к файлу .csv или .json')
+        parser.add_argument(
+            '--model', choices=MODELS, default='ingredients',
+            help='Импортируемая модель')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT')
 
-    def handle(self, *args, **kwargs):
-        with open('data/ingredients.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
+    def read(self, path, fields):
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in ('.csv', '.json'):
+            raise CommandError('Поддерживаются только файлы .csv и .json')
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл {path} не найден')
+        with open(path, 'r', encoding='utf-8') as file:
+            if extension == '.json':
+                yield from read_json(file)
+            else:
+                yield from read_csv(file, fields)
 
-        for row in data:
-            account = Ingredient(
-                name=row['name'],
-                measurement_unit=row['measurement_unit']
-            )
-            account.save()
+    def handle(self, *args, **options):
+        config = MODELS[options['model']]
+        model, fields = config['model'], config['fields']
+        unique_fields = config['unique_fields']
+        rows = self.read(options['path'], fields)
+        total = 0
+        started = perf_counter()
+        with transaction.atomic():
+            while True:
+                batch = {}
+                for row in islice(rows, options['batch_size']):
+                    obj = model(**{field: row[field] for field in fields})
+                    key = tuple(getattr(obj, field) for field in unique_fields)
+                    batch[key] = obj
+                if not batch:
+                    break
+                if config['update_fields']:
+                    model.objects.bulk_create(
+                        batch.values(), update_conflicts=True,
+                        unique_fields=unique_fields,
+                        update_fields=config['update_fields'])
+                else:
+                    model.objects.bulk_create(batch.values(),
+                                              ignore_conflicts=True)
+                total += len(batch)
+        bump_version(model)
+        elapsed = perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {total} за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else total:.0f} строк/с)'))
@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand
+
+from api.images import make_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    '''
+    Создание уменьшенных копий фото для уже существующих рецептов.
+    Выполнить команду python manage.py make_image_variants
+    '''
+
+    help = 'Создание миниатюр и детальных копий фото рецептов'
+
+    def handle(self, *args, **options):
+        names = (Recipe.objects.exclude(image='')
+                 .values_list('image', flat=True).distinct())
+        total = 0
+        for name in names.iterator():
+            make_variants(name)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {total}'))
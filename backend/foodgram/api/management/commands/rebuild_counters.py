@@ -0,0 +1,65 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favourite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+
+def count_of(model, field):
+    '''Подзапрос с числом строк model, ссылающихся на текущий объект'''
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(total=Count('pk'))
+        .values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+COUNTERS = (
+    (Recipe, 'favourites_count', Favourite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+class Command(BaseCommand):
+    '''
+    Пересчет денормализованных счетчиков рецептов и пользователей.
+    Выполнить команду python manage.py rebuild_counters
+    С ключом --check только проверяет расхождения.
+    '''
+
+    help = 'Пересчет счетчиков избранного, покупок, рецептов и подписчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить счетчики, ничего не меняя')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            self.check_counters()
+            return
+        with transaction.atomic():
+            for model, counter, related, field in COUNTERS:
+                updated = model.objects.update(
+                    **{counter: count_of(related, field)})
+                self.stdout.write(f'{model.__name__}.{counter}: {updated}')
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
+
+    def check_counters(self):
+        errors = 0
+        for model, counter, related, field in COUNTERS:
+            wrong = (model.objects.annotate(actual=count_of(related, field))
+                     .exclude(**{counter: F('actual')}).count())
+            if wrong:
+                self.stdout.write(self.style.WARNING(
+                    f'{model.__name__}.{counter}: расхождений {wrong}'))
+            errors += wrong
+        if errors:
+            raise CommandError('Счетчики расходятся, запустите '
+                               'rebuild_counters без --check')
+        self.stdout.write(self.style.SUCCESS('Счетчики верны'))
@@ -0,0 +1,25 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand
+
+from api.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    '''
+    Сверка лент подписок /api/recipes/feed/ с подписками.
+    Выполнить команду python manage.py rebuild_feed
+    '''
+
+    help = 'Сверка лент подписок с подписками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        removed, created = rebuild_feeds(batch_size=options['batch_size'])
+        elapsed = perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей ленты: {removed}, добавлено: {created} '
+            f'за {elapsed:.2f} с'))
@@ -0,0 +1,25 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand
+
+from api.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    '''
+    Пересчет поискового индекса всех рецептов для ?search=.
+    Выполнить после миграций и после переименования ингредиентов:
+    python manage.py rebuild_search_index
+    '''
+
+    help = 'Пересчет поискового индекса рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        updated = update_search_vectors(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {updated} '
+            f'за {perf_counter() - started:.2f} с'))
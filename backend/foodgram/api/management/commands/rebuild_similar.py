@@ -0,0 +1,25 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand
+
+from api.similar import update_signatures
+
+
+class Command(BaseCommand):
+    '''
+    Пересчет MinHash-сигнатур и корзин LSH всех рецептов
+    для /api/recipes/{id}/similar/.
+    Выполнить команду python manage.py rebuild_similar
+    '''
+
+    help = 'Пересчет сигнатур для поиска похожих рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        updated = update_signatures(batch_size=options['batch_size'])
+        elapsed = perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано сигнатур: {updated} за {elapsed:.2f} с'))
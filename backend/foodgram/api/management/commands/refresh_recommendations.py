@@ -0,0 +1,30 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand
+
+from api.recommendations import np, refresh_neighbours
+
+
+class Command(BaseCommand):
+    '''
+    Пересчет рекомендаций "вместе с этим добавляют в избранное".
+    Запускать периодически, например раз в час из cron:
+    python manage.py refresh_recommendations
+    Раз в сутки запускать с --full, чтобы учесть удаления из избранного.
+    '''
+
+    help = 'Пересчет соседей рецептов по совместному избранному'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать все рецепты')
+        parser.add_argument('--top-k', type=int, default=20,
+                            help='Сколько соседей хранить для рецепта')
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        recipes, rows = refresh_neighbours(options['full'], options['top_k'])
+        engine = 'numpy/scipy' if np is not None else 'python'
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, соседей: {rows} '
+            f'за {perf_counter() - started:.2f} с ({engine})'))
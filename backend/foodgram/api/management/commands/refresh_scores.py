@@ -0,0 +1,50 @@
+from itertools import islice
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+CART_WEIGHT = 0.5
+GRAVITY = 1.5
+
+
+def decayed_score(favourites, carts, age_hours):
+    '''Рейтинг падает со временем, как в ленте Hacker News'''
+    return (favourites + CART_WEIGHT * carts) / (age_hours + 2) ** GRAVITY
+
+
+class Command(BaseCommand):
+    '''
+    Пересчет рейтингов популярности для сортировки ?ordering=popular.
+    Запускать периодически, например раз в час из cron:
+    python manage.py refresh_scores
+    '''
+
+    help = 'Пересчет рейтингов популярности рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        rows = Recipe.objects.values_list(
+            'id', 'favourites_count', 'in_carts_count', 'date'
+        ).iterator(chunk_size=options['batch_size'])
+        total = 0
+        with transaction.atomic():
+            while True:
+                batch = [
+                    Recipe(pk=pk, score=decayed_score(
+                        favourites, carts,
+                        (now - date).total_seconds() / 3600))
+                    for pk, favourites, carts, date
+                    in islice(rows, options['batch_size'])
+                ]
+                if not batch:
+                    break
+                Recipe.objects.bulk_update(batch, ('score',))
+                total += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рейтингов: {total}'))
@@ -0,0 +1,179 @@
+import io
+import os
+import random
+from datetime import timedelta
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand, call_command
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from api.cache import bump_version
+from recipes.models import (Favourite, ImageBlob, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.storage import image_storage
+from users.models import Follow, User
+
+PASSWORD = 'load-password'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#B05F3C', 'bakery'),
+    ('Вегетарианское', '#2D9CDB', 'vegetarian'),
+)
+WORDS = ('суп', 'салат', 'пирог', 'рагу', 'каша', 'запеканка', 'паста',
+         'омлет', 'котлеты', 'плов', 'домашний', 'быстрый', 'летний',
+         'острый', 'сырный', 'овощной', 'бабушкин', 'праздничный')
+
+
+def skewed(rng, population, k):
+    '''
+    Выборка без повторов, в которой первые элементы популярнее:
+    так распределены подписки и избранное на реальных данных.
+    '''
+    k = min(k, len(population))
+    chosen = set()
+    while len(chosen) < k:
+        chosen.add(population[int(len(population) * rng.random() ** 2)])
+    return chosen
+
+
+class Command(BaseCommand):
+    '''
+    Генерация больших наборов данных для нагрузочных замеров.
+    Выполнить команду python manage.py seed_load --users 1000
+    При одинаковом --seed данные получаются одинаковыми.
+    Пароль всех созданных пользователей - load-password.
+    '''
+
+    help = 'Генерация пользователей, рецептов, подписок, избранного и покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=10,
+                            help='Рецептов на пользователя в среднем')
+        parser.add_argument('--ingredients', type=int, default=8,
+                            help='Ингредиентов на рецепт в среднем')
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Подписок на пользователя в среднем')
+        parser.add_argument('--favourites', type=int, default=20,
+                            help='Рецептов в избранном на пользователя')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Рецептов в списке покупок на пользователя')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество строк в одном INSERT')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = perf_counter()
+        if not Ingredient.objects.exists():
+            call_command('import_db', os.path.join(
+                settings.BASE_DIR, 'data', 'ingredients.csv'),
+                stdout=self.stdout)
+        with transaction.atomic():
+            tags = self.create_tags()
+            users = self.create_users(options['users'], options['seed'])
+            recipes = self.create_recipes(users, tags, options)
+            self.create_links(Follow, 'author_id', users, users,
+                              options['follows'])
+            self.create_links(Favourite, 'recipe_id', users, recipes,
+                              options['favourites'])
+            self.create_links(ShoppingCart, 'recipe_id', users, recipes,
+                              options['carts'])
+        call_command('rebuild_counters', stdout=self.stdout)
+        call_command('refresh_scores', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, рецептов: '
+            f'{len(recipes)} за {perf_counter() - started:.2f} с'))
+
+    def create_tags(self):
+        Tag.objects.bulk_create(
+            [Tag(name=name, color=color, slug=slug)
+             for name, color, slug in TAGS],
+            ignore_conflicts=True)
+        bump_version(Tag)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, count, seed):
+        password = make_password(PASSWORD)
+        prefix = f'load{seed}_'
+        offset = User.objects.filter(username__startswith=prefix).count()
+        users = [
+            User(username=f'{prefix}{number}',
+                 email=f'{prefix}{number}@example.com',
+                 first_name='Тест', last_name=f'Пользователь {number}',
+                 password=password)
+            for number in range(offset, offset + count)
+        ]
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+        return [user.id for user in users]
+
+    def create_image(self):
+        '''Одно общее изображение на все рецепты, файл сохраняется один раз'''
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), (226, 108, 45)).save(buffer, 'JPEG')
+        name = image_storage.save('recipes/load.jpg',
+                                  ContentFile(buffer.getvalue()))
+        ImageBlob.objects.get_or_create(name=name)
+        return name
+
+    def create_recipes(self, users, tags, options):
+        rng = self.rng
+        image = self.create_image()
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        now = timezone.now()
+        recipes = []
+        for author in users:
+            for _ in range(rng.randint(0, 2 * options['recipes'])):
+                name = ' '.join(rng.sample(WORDS, 3)).capitalize()
+                recipes.append(Recipe(
+                    author_id=author, name=name, image=image,
+                    text=f'{name}. ' * rng.randint(5, 40),
+                    cooking_time=rng.randint(5, 180)))
+        Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+        for recipe in recipes:
+            recipe.date = now - timedelta(minutes=rng.randint(0, 525600))
+        Recipe.objects.bulk_update(recipes, ('date',),
+                                   batch_size=self.batch_size)
+        ImageBlob.objects.filter(name=image).update(
+            refcount=Recipe.objects.filter(image=image).count())
+
+        recipe_tags = []
+        recipe_ingredients = []
+        for recipe in recipes:
+            for tag in rng.sample(tags, rng.randint(1, min(3, len(tags)))):
+                recipe_tags.append(Recipe.tags.through(
+                    recipe_id=recipe.id, tag_id=tag))
+            count = rng.randint(1, 2 * options['ingredients'])
+            for ingredient in rng.sample(ingredients,
+                                         min(count, len(ingredients))):
+                recipe_ingredients.append(RecipeIngredient(
+                    recipe_id=recipe.id, ingredient_id=ingredient,
+                    amount=rng.randint(1, 500)))
+        Recipe.tags.through.objects.bulk_create(
+            recipe_tags, batch_size=self.batch_size)
+        RecipeIngredient.objects.bulk_create(
+            recipe_ingredients, batch_size=self.batch_size)
+        return [recipe.id for recipe in recipes]
+
+    def create_links(self, model, field, users, targets, average):
+        '''Подписки, избранное или покупки для каждого пользователя'''
+        rows = []
+        for user in users:
+            count = self.rng.randint(0, 2 * average)
+            rows.extend(
+                model(user_id=user, **{field: target})
+                for target in skewed(self.rng, targets, count)
+                if target != user or field != 'author_id')
+            if len(rows) >= self.batch_size:
+                model.objects.bulk_create(rows, ignore_conflicts=True)
+                rows = []
+        model.objects.bulk_create(rows, ignore_conflicts=True)
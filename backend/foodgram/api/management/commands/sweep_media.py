@@ -0,0 +1,106 @@
+import os
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from api.images import VARIANTS, variant_name
+from recipes.models import ImageBlob, Recipe
+
+
+def source_root(name):
+    '''Имя оригинала без расширения для файла или его копии'''
+    root, _ = os.path.splitext(name)
+    for variant in VARIANTS:
+        if root.endswith(f'_{variant}'):
+            return root[:-len(variant) - 1]
+    return root
+
+
+def walk(storage, path):
+    '''Все файлы каталога хранилища, включая подкаталоги'''
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield os.path.join(path, name)
+    for directory in directories:
+        yield from walk(storage, os.path.join(path, directory))
+
+
+class Command(BaseCommand):
+    '''
+    Пересчет ссылок на изображения и удаление файлов без ссылок:
+    ImageBlob с нулевым счетчиком и файлов, которых нет в ImageBlob
+    (загрузки неудачных запросов и файлы, сохраненные до ImageBlob).
+    Выполнить команду python manage.py sweep_media
+    '''
+
+    help = 'Удаление изображений рецептов, на которые никто не ссылается'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=60,
+            help='Не трогать файлы моложе стольких минут')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено, по текущим '
+                 'счетчикам ссылок')
+
+    def recount(self):
+        '''Синхронизирует счетчики ссылок с таблицей рецептов'''
+        counts = dict(
+            Recipe.objects.exclude(image='').values('image')
+            .annotate(total=Count('id')).values_list('image', 'total'))
+        with transaction.atomic():
+            ImageBlob.objects.exclude(name__in=counts).exclude(
+                refcount=0).update(refcount=0, updated=timezone.now())
+            blobs = {blob.name: blob for blob in ImageBlob.objects.filter(
+                name__in=counts)}
+            for name, total in counts.items():
+                blob = blobs.setdefault(name, ImageBlob(name=name))
+                blob.refcount = total
+            ImageBlob.objects.bulk_create(
+                blobs.values(), update_conflicts=True,
+                unique_fields=('name',), update_fields=('refcount',))
+
+    def remove(self, storage, name, dry_run):
+        if not storage.exists(name):
+            return 0
+        if dry_run:
+            self.stdout.write(name)
+        else:
+            storage.delete(name)
+        return 1
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        dry_run = options['dry_run']
+        if not dry_run:
+            self.recount()
+        deadline = timezone.now() - timedelta(minutes=options['grace'])
+        removed = 0
+        for blob in ImageBlob.objects.filter(refcount=0,
+                                             updated__lt=deadline):
+            # Рецепт мог сослаться на файл уже после recount
+            if Recipe.objects.filter(image=blob.name).exists():
+                continue
+            if not dry_run and not ImageBlob.objects.filter(
+                    pk=blob.pk, refcount=0).delete()[0]:
+                continue
+            for name in (blob.name, *(variant_name(blob.name, variant)
+                                      for variant in VARIANTS)):
+                removed += self.remove(storage, name, dry_run)
+        tracked = {os.path.splitext(name)[0] for name in
+                   ImageBlob.objects.values_list('name', flat=True)}
+        if storage.exists('recipes'):
+            for name in walk(storage, 'recipes'):
+                root = source_root(name)
+                if (root in tracked
+                        or storage.get_modified_time(name) > deadline
+                        or Recipe.objects.filter(
+                            image__startswith=f'{root}.').exists()):
+                    continue
+                removed += self.remove(storage, name, dry_run)
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов без ссылок: {removed}'))
@@ -0,0 +1,81 @@
+import os
+from hmac import compare_digest
+from ipaddress import ip_address, ip_network
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_latency_seconds',
+    'Время обработки запроса по действию вьюсета',
+    ('view', 'method'),
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_request_db_queries',
+    'Количество SQL-запросов на один HTTP-запрос',
+    ('view',),
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, float('inf')),
+)
+REQUEST_SQL_TIME = Histogram(
+    'foodgram_request_db_seconds',
+    'Суммарное время SQL на один HTTP-запрос',
+    ('view',),
+)
+MODEL_EVENTS = Counter(
+    'foodgram_model_events_total',
+    'Созданные и удаленные объекты моделей',
+    ('model', 'action'),
+)
+
+
+def observe_request(view, method, duration, queries, sql_time):
+    view = view or 'unresolved'
+    REQUEST_LATENCY.labels(view, method).observe(duration)
+    REQUEST_QUERIES.labels(view).observe(queries)
+    REQUEST_SQL_TIME.labels(view).observe(sql_time)
+
+
+def model_event(model, action, amount=1):
+    if amount:
+        MODEL_EVENTS.labels(model._meta.model_name, action).inc(amount)
+
+
+def get_registry():
+    '''
+    При нескольких воркерах gunicorn метрики собираются из файлов
+    каталога PROMETHEUS_MULTIPROC_DIR.
+    '''
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def is_allowed(request):
+    '''
+    Метрики отдаются по токену METRICS_TOKEN или на адреса
+    из METRICS_ALLOWED_IPS, по умолчанию только локальные
+    '''
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and compare_digest(request.headers.get('Authorization', ''),
+                                f'Bearer {token}'):
+        return True
+    try:
+        address = ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(
+        address in ip_network(network, strict=False)
+        for network in getattr(settings, 'METRICS_ALLOWED_IPS',
+                               ('127.0.0.1', '::1')))
+
+
+def metrics_view(request):
+    if not is_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(get_registry()),
+                        content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,127 @@
+import json
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+from api.metrics import observe_request
+
+logger = logging.getLogger('api.requests')
+
+current_stats = ContextVar('current_stats', default=None)
+
+IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+
+
+def fingerprint(sql):
+    '''SQL без зависимости от длины списков IN (...)'''
+    return IN_LIST.sub('(%s, ...)', sql)
+
+
+class RequestStats:
+    '''Статистика SQL и сериализации одного запроса'''
+
+    def __init__(self):
+        self.queries = []
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, perf_counter() - started))
+
+    @property
+    def sql_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicates(self):
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+
+def timed_data(data):
+    '''Оборачивает BaseSerializer.data, чтобы учитывать время сериализации'''
+
+    def wrapper(serializer):
+        stats = current_stats.get()
+        if stats is None or stats.serializing:
+            return data.fget(serializer)
+        stats.serializing = True
+        started = perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            stats.serializer_time += perf_counter() - started
+            stats.serializing = False
+
+    return property(wrapper)
+
+
+def instrument_serializers():
+    if not getattr(BaseSerializer.data.fget, 'timed', False):
+        BaseSerializer.data = timed_data(BaseSerializer.data)
+        BaseSerializer.data.fget.timed = True
+
+
+class QueryStatsMiddleware:
+    '''
+    Считает запросы к базе, время SQL и сериализации, повторяющиеся
+    запросы. Отдает их в заголовке Server-Timing, метриках Prometheus
+    и пишет в лог, а для медленных запросов выводит весь SQL.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_serializers()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.report(request, response, stats, perf_counter() - started)
+        return response
+
+    def report(self, request, response, stats, total):
+        match = request.resolver_match
+        duplicates = stats.duplicates()
+        record = {
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': len(stats.queries),
+            'sql_ms': round(stats.sql_time * 1000, 2),
+            'serializer_ms': round(stats.serializer_time * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'duplicates': sum(duplicates.values()) - len(duplicates),
+        }
+        observe_request(record['view'], request.method, total,
+                        len(stats.queries), stats.sql_time)
+        if getattr(settings, 'SERVER_TIMING_HEADER', True):
+            response['Server-Timing'] = (
+                f'db;dur={record["sql_ms"]};desc="{record["queries"]} '
+                f'queries", ser;dur={record["serializer_ms"]}, '
+                f'total;dur={record["total_ms"]}')
+        if record['total_ms'] < getattr(settings, 'SLOW_REQUEST_MS', 500):
+            logger.info(json.dumps(record))
+            return
+        record['sql'] = [{'sql': sql, 'ms': round(duration * 1000, 2)}
+                         for sql, duration in stats.queries]
+        record['duplicate_sql'] = duplicates
+        logger.warning(json.dumps(record, ensure_ascii=False))
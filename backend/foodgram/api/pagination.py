@@ -1,5 +1,155 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class KeysetPagination(CursorPagination):
+    '''
+    Курсорная пагинация без OFFSET и COUNT(*). Позиция курсора - значения
+    всех полей ordering крайнего объекта страницы, поэтому одинаковые
+    даты на границе страницы не сбивают переход по next и previous.
+    '''
+
+    page_size_query_param = 'limit'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = self.ordering
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}'
+                        for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None and self.cursor.position is not None:
+            queryset = queryset.filter(
+                self.after(queryset.model, ordering, self.cursor.position))
+        rows = list(queryset[:self.page_size + 1])
+        self.page = rows[:self.page_size]
+        has_more = len(rows) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def after(self, model, ordering, position):
+        '''Условие "после позиции" по всем полям ordering'''
+        try:
+            values = json.loads(position)
+            if len(values) != len(ordering):
+                raise ValueError(position)
+            values = [model._meta.get_field(field.lstrip('-')).to_python(value)
+                      for field, value in zip(ordering, values)]
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        condition, equal = Q(), {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def position(self, instance):
+        return json.dumps([getattr(instance, field.lstrip('-'))
+                           for field in self.ordering], default=str)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self.position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True, position=self.position(self.page[0])))
+
+
+class FeedPagination(CustomPagination):
+    '''
+    Постраничная пагинация, а при ?pagination=cursor - курсорная
+    по полям cursor_ordering вьюсета. Параметры cursor_excluded_params
+    меняют порядок выдачи и с курсором не сочетаются.
+    '''
+
+    cursor_query_value = 'cursor'
+
+    def __init__(self):
+        self.keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get('pagination') != self.cursor_query_value:
+            return super().paginate_queryset(queryset, request, view)
+        excluded = [
+            param for param in getattr(view, 'cursor_excluded_params', ())
+            if param in request.query_params]
+        if excluded:
+            raise ValidationError({'pagination': (
+                'Курсорная пагинация несовместима с параметрами: '
+                f'{", ".join(excluded)}.')})
+        self.keyset = KeysetPagination(view.cursor_ordering)
+        return self.keyset.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class TimelinePagination(CursorPagination):
+    '''
+    Курсор по паре (date, id) последнего рецепта страницы. Страница
+    собирается функцией fetch(after, limit) из нескольких источников,
+    поэтому только вперед и без смещений в курсоре.
+    '''
+
+    page_size_query_param = 'limit'
+
+    def paginate_timeline(self, fetch, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        after = None
+        if cursor is not None:
+            date, _, pk = (cursor.position or '').rpartition('_')
+            try:
+                after = (datetime.fromisoformat(date), int(pk))
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+        rows = fetch(after, self.page_size + 1)
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return [pk for _, pk in self.page]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        date, pk = self.page[-1]
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=f'{date.isoformat()}_{pk}'))
+
+    def get_previous_link(self):
+        return None
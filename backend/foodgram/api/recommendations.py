@@ -0,0 +1,135 @@
+import heapq
+from collections import Counter, defaultdict
+from math import sqrt
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, Sum, Value, When
+
+from api.filters import ORDERINGS
+from recipes.models import Favourite, RecipeNeighbour, RecommendationRun
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+
+def neighbours_numpy(pairs, targets, top_k):
+    '''
+    Строки матрицы совместной встречаемости C = F.T @ F для рецептов
+    targets, где F - разреженная матрица пользователь x рецепт.
+    Сходство - косинусное: C[x, y] / sqrt(n[x] * n[y]).
+    '''
+    users, recipes = np.array(pairs, dtype=np.int64).T
+    recipe_ids, recipe_index = np.unique(recipes, return_inverse=True)
+    _, user_index = np.unique(users, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs)), (user_index, recipe_index)),
+        shape=(user_index.max() + 1, len(recipe_ids)))
+    counts = np.asarray(matrix.sum(axis=0)).ravel()
+    # Все targets взяты из того же избранного, поэтому есть в recipe_ids
+    rows = np.searchsorted(recipe_ids, targets)
+    cooccurrence = (matrix[:, rows].T @ matrix).tocsr()
+    for row, target in enumerate(rows):
+        start, end = cooccurrence.indptr[row:row + 2]
+        columns = cooccurrence.indices[start:end]
+        values = cooccurrence.data[start:end]
+        keep = columns != target
+        columns, values = columns[keep], values[keep]
+        scores = values / np.sqrt(counts[target] * counts[columns])
+        order = np.lexsort((recipe_ids[columns], -scores))[:top_k]
+        yield int(recipe_ids[target]), [
+            (int(recipe_ids[columns[i]]), float(scores[i])) for i in order]
+
+
+def neighbours_python(pairs, targets, top_k):
+    '''То же без NumPy: счетчики по пользователям, лайкнувшим рецепт'''
+    by_user = defaultdict(list)
+    by_recipe = defaultdict(list)
+    for user, recipe in pairs:
+        by_user[user].append(recipe)
+        by_recipe[recipe].append(user)
+    for target in targets:
+        if target not in by_recipe:
+            continue
+        cooccurrence = Counter()
+        for user in by_recipe[target]:
+            cooccurrence.update(by_user[user])
+        del cooccurrence[target]
+        total = len(by_recipe[target])
+        yield target, heapq.nsmallest(top_k, (
+            (other, count / sqrt(total * len(by_recipe[other])))
+            for other, count in cooccurrence.items()
+        ), key=lambda row: (-row[1], row[0]))
+
+
+def compute_neighbours(pairs, targets, top_k):
+    if np is None:
+        return neighbours_python(pairs, sorted(targets), top_k)
+    return neighbours_numpy(pairs, np.array(sorted(targets), dtype=np.int64),
+                            top_k)
+
+
+def refresh_neighbours(full=False, top_k=20, batch_size=1000):
+    '''
+    Пересчитывает соседей рецептов по избранному. Без full берутся
+    только рецепты, затронутые новыми записями Favourite с прошлого
+    запуска: все избранное пользователей, лайкнувших новые рецепты.
+    Удаления из избранного учитывает только полный пересчет.
+    '''
+    last_run = RecommendationRun.objects.first()
+    last_id = Favourite.objects.aggregate(last=Max('id'))['last'] or 0
+    favourites = Favourite.objects.filter(id__lte=last_id)
+    if full or last_run is None:
+        full = True
+        targets = set(favourites.values_list('recipe_id', flat=True))
+    else:
+        # Меняется и число лайков новых рецептов, а с ним сходство
+        # со всем, что лайкали их поклонники
+        new_recipes = favourites.filter(
+            id__gt=last_run.last_favourite_id).values('recipe_id')
+        fans = favourites.filter(recipe_id__in=new_recipes).values('user_id')
+        targets = set(favourites.filter(user_id__in=fans)
+                      .values_list('recipe_id', flat=True))
+    pairs = list(favourites.values_list('user_id', 'recipe_id'))
+    rows = []
+    if targets:
+        for recipe_id, neighbours in compute_neighbours(pairs, targets,
+                                                        top_k):
+            rows.extend(RecipeNeighbour(recipe_id=recipe_id,
+                                        neighbour_id=neighbour, score=score)
+                        for neighbour, score in neighbours)
+    with transaction.atomic():
+        stale = RecipeNeighbour.objects.all()
+        if not full:
+            stale = stale.filter(recipe_id__in=targets)
+        stale.delete()
+        RecipeNeighbour.objects.bulk_create(rows, batch_size=batch_size)
+        RecommendationRun.objects.create(last_favourite_id=last_id,
+                                         full=full, recipes=len(targets))
+    return len(targets), len(rows)
+
+
+def recommend(queryset, user):
+    '''
+    Рецепты, которые добавляли в избранное вместе с избранным user,
+    по сумме сходства. Без избранного - популярные рецепты.
+    '''
+    liked = Favourite.objects.filter(user=user).values('recipe_id')
+    ranked = list(
+        RecipeNeighbour.objects.filter(recipe_id__in=liked)
+        .exclude(neighbour_id__in=liked)
+        .values('neighbour_id').annotate(total=Sum('score'))
+        .order_by('-total', 'neighbour_id')
+        .values_list('neighbour_id', flat=True)
+        [:getattr(settings, 'RECOMMENDATIONS_LIMIT', 100)])
+    if not ranked:
+        return queryset.exclude(pk__in=liked).order_by(*ORDERINGS['popular'])
+    return queryset.filter(pk__in=ranked).annotate(
+        recommendation_rank=Case(
+            *(When(pk=pk, then=Value(position))
+              for position, pk in enumerate(ranked)),
+            output_field=IntegerField())
+    ).order_by('recommendation_rank')
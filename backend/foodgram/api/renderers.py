@@ -0,0 +1,76 @@
+from django.db.models.fields.files import FieldFile
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+LINE_SEPARATORS = (
+    (b'\xe2\x80\xa8', b'\\u2028'),
+    (b'\xe2\x80\xa9', b'\\u2029'),
+)
+
+
+class Encoder(JSONEncoder):
+    '''
+    Типы, которые orjson не сериализует сам. Файлы и изображения
+    отдаются ссылкой, остальное как в стандартном кодировщике DRF.
+    '''
+
+    def __init__(self, request=None):
+        super().__init__()
+        self.request = request
+
+    def default(self, obj):
+        if isinstance(obj, FieldFile):
+            if not obj:
+                return None
+            if self.request is None:
+                return obj.url
+            return self.request.build_absolute_uri(obj.url)
+        return super().default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    '''
+    JSONRenderer на orjson. Без orjson и для ответов с отступами
+    (например, в BrowsableAPIRenderer) работает стандартный рендерер.
+    '''
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if (orjson is None or data is None
+                or self.get_indent(accepted_media_type, renderer_context)):
+            return super().render(data, accepted_media_type, renderer_context)
+        encoder = Encoder(renderer_context.get('request'))
+        try:
+            content = orjson.dumps(
+                data, default=encoder.default,
+                option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            # Например, целые числа больше 64 бит
+            return super().render(data, accepted_media_type, renderer_context)
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in content:
+                content = content.replace(separator, escaped)
+        return content
+
+
+class FastJSONParser(JSONParser):
+    '''JSONParser на orjson, без него работает стандартный парсер'''
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        if orjson is None or encoding.lower() not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
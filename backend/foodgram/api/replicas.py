@@ -0,0 +1,128 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+from api.cache import get_cache
+
+
+class RequestState:
+    '''База для чтения в текущем запросе и были ли в нем записи'''
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+request_state = ContextVar('replica_request_state', default=None)
+
+
+def replica_aliases():
+    return getattr(settings, 'REPLICA_DATABASES', ())
+
+
+def max_lag():
+    '''Сколько секунд после записи реплика может отдавать старые данные'''
+    return getattr(settings, 'REPLICA_MAX_LAG', 10)
+
+
+def pin_key(user_id):
+    return f'replica:pinned:{user_id}'
+
+
+def reading_replica():
+    state = request_state.get()
+    return state is not None and state.replica is not None and not state.wrote
+
+
+def choose_replica(user):
+    '''
+    Случайная реплика или None, если реплик нет или пользователь
+    недавно писал и должен видеть свои изменения
+    '''
+    aliases = replica_aliases()
+    if not aliases:
+        return None
+    if user.is_authenticated and get_cache().get(pin_key(user.pk)):
+        return None
+    return random.choice(aliases)
+
+
+class ReplicaRouter:
+    '''
+    Запись всегда в основную базу. Чтение - с реплики, выбранной
+    ReplicaReadMixin, пока в запросе ничего не записано.
+    '''
+
+    def db_for_read(self, model, **hints):
+        if reading_replica():
+            return request_state.get().replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # В репликах те же данные, что в основной базе
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    '''
+    Заводит состояние маршрутизации на время запроса. После записи
+    закрепляет пользователя за основной базой на REPLICA_MAX_LAG секунд.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState()
+        token = request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_state.reset(token)
+        user = getattr(request, 'user', None)
+        if (state.wrote and replica_aliases() and user is not None
+                and user.is_authenticated):
+            get_cache().set(pin_key(user.pk), True, max_lag())
+        return response
+
+
+class ReplicaReadMixin:
+    '''
+    Безопасные запросы к действиям replica_actions (по умолчанию
+    ко всем) читают с реплики
+    '''
+
+    replica_actions = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = request_state.get()
+        if (state is None or request.method not in SAFE_METHODS
+                or (self.replica_actions is not None
+                    and self.action not in self.replica_actions)):
+            return
+        state.replica = choose_replica(request.user)
+
+    def get_cache_timeout(self):
+        '''
+        Реплика могла еще не получить изменение, после которого сменилась
+        версия VersionedCacheMixin, поэтому ее ответ хранится недолго
+        '''
+        timeout = super().get_cache_timeout()
+        if reading_replica():
+            return min(timeout, max_lag())
+        return timeout
@@ -0,0 +1,348 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter, namedtuple
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import (Case, F, IntegerField, OuterRef, Subquery, Value,
+                              When)
+from django.db.models.functions import Coalesce, StrIndex
+
+from api.cache import bump_version, get_cache, get_version, is_shared
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+
+Snapshot = namedtuple('Snapshot', ('rows', 'keys', 'grams', 'by_pk',
+                                   'version', 'built_at'))
+
+
+def trigrams(value):
+    '''Множество триграмм строки'''
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class IngredientIndex:
+    '''
+    Индекс ингредиентов в памяти процесса для автодополнения.
+    Строится при первом обращении, перестраивается при смене версии
+    справочника в кэше, по сигналам модели Ingredient и по истечении
+    INGREDIENT_INDEX_TTL секунд.
+    '''
+
+    def __init__(self):
+        self._lock = Lock()
+        self._snapshot = None
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _is_fresh(self, snapshot):
+        ttl = getattr(settings, 'INGREDIENT_INDEX_TTL', 300)
+        return (snapshot is not None
+                and monotonic() - snapshot.built_at < ttl
+                and snapshot.version == get_version(Ingredient))
+
+    def _build(self):
+        version = get_version(Ingredient)
+        # Снимок помечается версией из кэша, которую реплика может
+        # еще не догнать, поэтому он строится по основной базе
+        ingredients = Ingredient.objects.using(DEFAULT_DB_ALIAS).values_list(
+            'id', 'name', 'measurement_unit')
+        rows = sorted((
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for pk, name, unit in ingredients
+        ), key=lambda row: (row['name'].lower(), row['id']))
+        keys = [row['name'].lower() for row in rows]
+        grams = {}
+        for position, key in enumerate(keys):
+            for gram in trigrams(key):
+                grams.setdefault(gram, []).append(position)
+        by_pk = sorted(rows, key=lambda row: row['id'])
+        return Snapshot(rows, keys, grams, by_pk, version, monotonic())
+
+    def get_snapshot(self):
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+        with self._lock:
+            if not self._is_fresh(self._snapshot):
+                self._snapshot = self._build()
+            return self._snapshot
+
+    @staticmethod
+    def _prefix(snapshot, query):
+        keys = snapshot.keys
+        position = bisect_left(keys, query)
+        while position < len(keys) and keys[position].startswith(query):
+            yield position
+            position += 1
+
+    @staticmethod
+    def _contains(snapshot, query, exclude):
+        postings = sorted((snapshot.grams.get(gram, ())
+                           for gram in trigrams(query)), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        keys = snapshot.keys
+        found = [position for position in candidates
+                 if position not in exclude and query in keys[position]]
+        return sorted(found, key=lambda p: (keys[p].find(query), keys[p]))
+
+    def search(self, query, limit=None):
+        '''
+        Ингредиенты, название которых начинается с query, затем
+        содержащие query. Пустой запрос возвращает весь справочник.
+        '''
+        snapshot = self.get_snapshot()
+        query = query.strip().lower()
+        if not query:
+            return snapshot.by_pk[:limit]
+        positions = []
+        for position in self._prefix(snapshot, query):
+            positions.append(position)
+            if len(positions) == limit:
+                break
+        else:
+            if len(query) >= 3:
+                positions += self._contains(snapshot, query, set(positions))
+        return [snapshot.rows[position] for position in positions[:limit]]
+
+
+ingredient_index = IngredientIndex()
+
+
+class RecipeIngredientIndex:
+    '''
+    Обратный индекс: id ингредиента -> отсортированный массив id рецептов.
+    Отвечает на запрос "что приготовить из того, что есть" без
+    обращения к базе.
+
+    Изменения рецептов записываются в кэш под номерами версий, и каждый
+    процесс применяет их к своему индексу при следующем запросе. Если
+    записи изменений вытеснены из кэша или прошло RECIPE_INDEX_TTL
+    секунд, индекс строится заново. Изменения видны другим воркерам
+    только через общий кэш (REDIS_URL), без него индекс перестраивается
+    каждые RECIPE_INDEX_LOCAL_TTL секунд.
+    '''
+
+    MAX_CHANGES = 1000
+
+    def __init__(self):
+        self._lock = Lock()
+        self.postings = {}
+        self.recipes = {}
+        self.version = None
+        self.built_at = 0
+
+    @staticmethod
+    def change_key(version):
+        return f'recipe-index:change:{version}'
+
+    def changed(self, recipe_id):
+        '''Отмечает, что ингредиенты рецепта изменились или он удален'''
+
+        def record():
+            version = bump_version(RecipeIngredient)
+            get_cache().set(self.change_key(version), recipe_id,
+                            getattr(settings, 'RECIPE_INDEX_TTL', 3600))
+
+        transaction.on_commit(record)
+
+    def _load(self, recipe_ids=None):
+        # Как и снимок ингредиентов, только по основной базе
+        rows = (RecipeIngredient.objects.using(DEFAULT_DB_ALIAS)
+                .order_by('recipe_id'))
+        if recipe_ids is not None:
+            rows = rows.filter(recipe_id__in=recipe_ids)
+        recipes = {}
+        for recipe_id, ingredient_id in rows.values_list(
+                'recipe_id', 'ingredient_id').iterator(chunk_size=5000):
+            recipes.setdefault(recipe_id, []).append(ingredient_id)
+        return recipes
+
+    def _build(self, version):
+        recipes = self._load()
+        postings = {}
+        for recipe_id, ingredients in recipes.items():
+            for ingredient_id in ingredients:
+                postings.setdefault(ingredient_id, array('q')).append(
+                    recipe_id)
+        self.postings = postings
+        self.recipes = {recipe_id: tuple(ingredients)
+                        for recipe_id, ingredients in recipes.items()}
+        self.version = version
+        self.built_at = monotonic()
+
+    def _apply(self, recipe_ids):
+        '''
+        Перечитывает ингредиенты рецептов. Массивы заменяются копиями,
+        чтобы параллельные запросы видели их целиком.
+        '''
+        fresh = self._load(recipe_ids)
+        for recipe_id in recipe_ids:
+            old = set(self.recipes.pop(recipe_id, ()))
+            new = set(fresh.get(recipe_id, ()))
+            for ingredient_id in old - new:
+                posting = array('q', self.postings[ingredient_id])
+                del posting[bisect_left(posting, recipe_id)]
+                self.postings[ingredient_id] = posting
+            for ingredient_id in new - old:
+                posting = array('q', self.postings.get(ingredient_id, ()))
+                posting.insert(bisect_left(posting, recipe_id), recipe_id)
+                self.postings[ingredient_id] = posting
+            if new:
+                self.recipes[recipe_id] = tuple(new)
+
+    def _is_fresh(self, version):
+        if is_shared(get_cache()):
+            ttl = getattr(settings, 'RECIPE_INDEX_TTL', 3600)
+        else:
+            ttl = getattr(settings, 'RECIPE_INDEX_LOCAL_TTL', 30)
+        return self.version == version and monotonic() - self.built_at < ttl
+
+    def _sync(self):
+        version = get_version(RecipeIngredient)
+        if self._is_fresh(version):
+            return
+        with self._lock:
+            if self._is_fresh(version):
+                return
+            behind = (version - self.version
+                      if self.version is not None else None)
+            if behind is None or not 0 < behind <= self.MAX_CHANGES:
+                self._build(version)
+                return
+            keys = [self.change_key(number)
+                    for number in range(self.version + 1, version + 1)]
+            changes = get_cache().get_many(keys)
+            if len(changes) < len(keys):
+                self._build(version)
+                return
+            self._apply(set(changes.values()))
+            self.version = version
+
+    def rank(self, have):
+        '''
+        Рецепты, в которых есть хотя бы один ингредиент из have:
+        список (id рецепта, есть ингредиентов, не хватает ингредиентов),
+        сначала те, где совпало больше, затем где меньше не хватает.
+        '''
+        self._sync()
+        counts = Counter()
+        for ingredient_id in set(have):
+            counts.update(self.postings.get(ingredient_id, ()))
+        recipes = self.recipes
+        ranked = [
+            (recipe_id, found,
+             max(len(recipes.get(recipe_id, ())) - found, 0))
+            for recipe_id, found in counts.items()
+        ]
+        ranked.sort(key=lambda row: (-row[1], row[2], -row[0]))
+        return ranked
+
+
+recipe_index = RecipeIngredientIndex()
+
+
+def rank_by_ingredients(queryset, have):
+    '''
+    Оставляет рецепты, которые можно приготовить хотя бы частично
+    из ингредиентов have, и аннотирует missing_count. Ранжируются только
+    первые HAVE_RESULTS_LIMIT совпадений, чтобы списки IN были конечными.
+    '''
+    limit = getattr(settings, 'HAVE_RESULTS_LIMIT', 1000)
+    groups = {}
+    for recipe_id, found, missing in recipe_index.rank(have)[:limit]:
+        groups.setdefault((found, missing), []).append(recipe_id)
+    if not groups:
+        return queryset.none()
+    order = sorted(groups, key=lambda key: (-key[0], key[1]))
+    return queryset.filter(
+        pk__in=[pk for ids in groups.values() for pk in ids]
+    ).annotate(
+        have_rank=Case(*(When(pk__in=groups[key], then=Value(position))
+                         for position, key in enumerate(order)),
+                       output_field=IntegerField()),
+        missing_count=Case(*(When(pk__in=groups[key], then=Value(key[1]))
+                             for key in order),
+                           output_field=IntegerField()),
+    ).order_by('have_rank', '-date', '-id')
+
+
+def search_config():
+    return getattr(settings, 'SEARCH_CONFIG', 'russian')
+
+
+def is_postgres(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def search_document(name, ingredients, text):
+    '''Текст для поиска без PostgreSQL: название, ингредиенты, описание'''
+    return '\n'.join((name, ' '.join(ingredients), text)).lower()
+
+
+def update_search_vectors(ids=None, batch_size=500):
+    '''
+    Пересчитывает поисковый индекс рецептов с указанными id (или всех).
+    В PostgreSQL это tsvector с весами: название A, ингредиенты B,
+    описание C. В других базах в поле хранится текст в нижнем регистре.
+    '''
+    recipes = Recipe.objects.all()
+    if ids is not None:
+        recipes = recipes.filter(pk__in=ids)
+    if is_postgres(recipes):
+        # Модуль импортирует psycopg2, которого может не быть без PostgreSQL
+        from django.contrib.postgres.aggregates import StringAgg
+
+        config = search_config()
+        names = Subquery(
+            RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+            .order_by().values('recipe')
+            .annotate(names=StringAgg('ingredient__name', ' '))
+            .values('names'))
+        return recipes.update(search_vector=(
+            SearchVector('name', weight='A', config=config)
+            + SearchVector(Coalesce(names, Value('')), weight='B',
+                           config=config)
+            + SearchVector('text', weight='C', config=config)))
+    recipes = recipes.order_by('pk').only('name', 'text')
+    updated = last_pk = 0
+    while True:
+        batch = list(recipes.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return updated
+        ingredients = {}
+        for recipe_id, name in RecipeIngredient.objects.filter(
+                recipe__in=batch).values_list('recipe_id', 'ingredient__name'):
+            ingredients.setdefault(recipe_id, []).append(name)
+        for recipe in batch:
+            recipe.search_vector = search_document(
+                recipe.name, ingredients.get(recipe.pk, ()), recipe.text)
+        Recipe.objects.bulk_update(batch, ('search_vector',))
+        updated += len(batch)
+        last_pk = batch[-1].pk
+
+
+def search_recipes(queryset, query):
+    '''
+    Полнотекстовый поиск с ранжированием. В PostgreSQL по tsvector
+    и GIN-индексу, в других базах по вхождению всех слов в текст.
+    '''
+    if is_postgres(queryset):
+        query = SearchQuery(query, config=search_config(),
+                            search_type='websearch')
+        return (queryset.filter(search_vector=query)
+                .annotate(search_rank=SearchRank(F('search_vector'), query))
+                .order_by('-search_rank', '-date', '-id'))
+    terms = query.lower().split()
+    if not terms:
+        return queryset
+    for term in terms:
+        queryset = queryset.filter(search_vector__contains=term)
+    # Чем раньше встретилось слово, тем выше: название идет первым
+    return (queryset
+            .annotate(search_rank=StrIndex('search_vector', Value(terms[0])))
+            .order_by('search_rank', '-date', '-id'))
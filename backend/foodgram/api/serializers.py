@@ -5,13 +5,101 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SerializerMethodField
 from rest_framework.serializers import ModelSerializer, PrimaryKeyRelatedField
 
+from api.feed import publish
 from api.fields import Base64ImageField
+from api.images import release, retain, schedule_variants, variant_urls
+from api.search import recipe_index, update_search_vectors
+from api.similar import update_signatures
 from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
 from users.models import Follow, User
 
 
-class MyUserSerializer(UserSerializer):
+def parse_fields(value):
+    '''"id,author.username" -> {'id': [], 'author': ['username']}'''
+    selection = {}
+    for path in value.split(','):
+        name, _, rest = path.strip().partition('.')
+        if name:
+            selection.setdefault(name, [])
+            if rest:
+                selection[name].append(rest)
+    return selection
+
+
+class DynamicFieldsMixin:
+    '''
+    Выбор полей ответа параметрами ?fields=id,name,author.username
+    и ?omit=text,author.email. Параметры запроса читает только корневой
+    сериализатор, вложенным передается часть пути после точки.
+    '''
+
+    selection = None
+
+    @classmethod
+    def requested(cls, request):
+        params = request.query_params if request is not None else {}
+        only = params.get('fields')
+        only = parse_fields(only) if only else None
+        omit = parse_fields(params.get('omit', ''))
+        cls.check_names('fields', only or {})
+        cls.check_names('omit', omit)
+        return only, omit
+
+    @classmethod
+    def check_names(cls, param, selection, prefix=''):
+        '''Неизвестные поля, в том числе вложенные, - ошибка 400'''
+        for name, paths in selection.items():
+            if name not in cls.Meta.fields:
+                raise ValidationError(
+                    {param: f'Неизвестное поле: {prefix}{name}.'})
+            if not paths:
+                continue
+            field = cls._declared_fields.get(name)
+            nested = getattr(field, 'child', field)
+            if not isinstance(nested, DynamicFieldsMixin):
+                raise ValidationError(
+                    {param: f'У поля {prefix}{name} нет вложенных полей.'})
+            nested.check_names(param, parse_fields(','.join(paths)),
+                               f'{prefix}{name}.')
+
+    @classmethod
+    def selected_fields(cls, request):
+        '''Поля верхнего уровня, которые попадут в ответ'''
+        return cls.select(cls.Meta.fields, *cls.requested(request))
+
+    @staticmethod
+    def select(names, only, omit):
+        return [name for name in names
+                if (only is None or name in only)
+                and not (name in omit and not omit[name])]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self.parent is None or (
+            isinstance(self.parent, serializers.ListSerializer)
+            and self.parent.parent is None)
+        if self.selection is not None:
+            only, omit = self.selection
+        elif root:
+            only, omit = self.requested(self.context.get('request'))
+        else:
+            return fields
+        selected = self.select(fields, only, omit)
+        for name in list(fields):
+            if name not in selected:
+                del fields[name]
+                continue
+            nested = getattr(fields[name], 'child', fields[name])
+            if isinstance(nested, DynamicFieldsMixin):
+                nested.selection = (
+                    parse_fields(','.join(only[name]))
+                    if only and only[name] else None,
+                    parse_fields(','.join(omit.get(name, ()))))
+        return fields
+
+
+class MyUserSerializer(DynamicFieldsMixin, UserSerializer):
     '''Сериализатор пользователя'''
 
     is_subscribed = SerializerMethodField(read_only=True)
@@ -25,6 +113,8 @@ class MyUserSerializer(UserSerializer):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Follow.objects.filter(user=user, author=obj).exists()
 
 
@@ -34,17 +124,32 @@ class RecipeShowSerializer(ModelSerializer):
     в подписках, избранном и покупках
     '''
 
+    image_variants = SerializerMethodField(read_only=True)
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image, self.context.get('request'))
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    '''Список id рецептов для пакетного добавления и удаления'''
+
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1),
+                                allow_empty=False, max_length=100)
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
 
 
 class FollowSerializer(MyUserSerializer):
     '''Сериализатор подписoк'''
 
-    recipes_count = serializers.IntegerField(source='recipes.count',
-                                             read_only=True)
-    recipes = RecipeShowSerializer(many=True, read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
+    recipes = RecipeShowSerializer(source='latest_recipes',
+                                   many=True, read_only=True)
     is_subscribed = serializers.BooleanField(default=True)
 
     class Meta:
@@ -90,7 +195,7 @@ class IngredientRecipeCreationSerializer(ModelSerializer):
         return data
 
 
-class RecipeGetSerializer(ModelSerializer):
+class RecipeGetSerializer(DynamicFieldsMixin, ModelSerializer):
     '''Сериализатор получения рецепта'''
 
     tags = TagSerializer(many=True, read_only=True)
@@ -100,20 +205,31 @@ class RecipeGetSerializer(ModelSerializer):
     image = Base64ImageField()
     is_favorited = SerializerMethodField(read_only=True)
     is_in_shopping_cart = SerializerMethodField(read_only=True)
+    image_variants = SerializerMethodField(read_only=True)
+    # Только в ответах с ?have=, иначе поле пропускается
+    missing_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart', 'name',
-                  'image', 'text', 'cooking_time')
+                  'image', 'image_variants', 'text', 'cooking_time',
+                  'missing_count')
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image, self.context.get('request'))
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_anonymous:
             return False
         return Favourite.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if user.is_anonymous:
             return False
@@ -180,13 +296,62 @@ class RecipeCreateSerializer(ModelSerializer):
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         self.addon_for_create_update_methods(ingredients, tags, recipe)
+        update_search_vectors((recipe.pk,))
+        recipe_index.changed(recipe.pk)
+        update_signatures((recipe.pk,))
+        publish(recipe)
+        retain(recipe.image.name)
+        schedule_variants(recipe.image.name)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        '''
+        Применяет к рецепту только разницу в ингредиентах:
+        неизмененные строки не перезаписываются
+        '''
+        current = {row.ingredient_id: row
+                   for row in recipe.recipeingredient.all()}
+        amounts = {item['id'].id: item['amount'] for item in ingredients}
+        removed = current.keys() - amounts.keys()
+        if removed:
+            recipe.recipeingredient.filter(ingredient_id__in=removed).delete()
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        added = amounts.keys() - current.keys()
+        if added:
+            RecipeIngredient.objects.bulk_create([RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amounts[ingredient_id],
+            ) for ingredient_id in added])
+
     @atomic
     def update(self, recipe, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        recipe.tags.clear()
-        recipe.ingredients.clear()
-        self.addon_for_create_update_methods(ingredients, tags, recipe)
-        return super().update(recipe, validated_data)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if tags is not None:
+            recipe.tags.set(tags)
+        if ingredients is not None:
+            self.update_ingredients(recipe, ingredients)
+            recipe_index.changed(recipe.pk)
+        old_image = recipe.image.name
+        for attr, value in validated_data.items():
+            setattr(recipe, attr, value)
+        # Счетчики рецепта обновляются через F() и не перезаписываются
+        recipe.save(update_fields=validated_data.keys())
+        searchable = {'name', 'text'} & validated_data.keys()
+        if searchable or ingredients is not None:
+            update_search_vectors((recipe.pk,))
+        if tags is not None or ingredients is not None:
+            update_signatures((recipe.pk,))
+        if recipe.image.name != old_image:
+            release(old_image)
+            retain(recipe.image.name)
+            schedule_variants(recipe.image.name)
+        return recipe
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_token, invalidate_user_tokens
+from api.cache import bump_version
+from api.search import ingredient_index
+from recipes.models import Ingredient, Tag
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def bump_reference_version(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_changed_user(sender, instance, update_fields=None, **kwargs):
+    '''
+    Сброс кэша токенов при смене пароля, деактивации и других
+    изменениях пользователя. Обновление last_login при входе пропускается.
+    '''
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_user_tokens(instance)
@@ -0,0 +1,130 @@
+import random
+from array import array
+from functools import reduce
+from hashlib import blake2b
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import (Recipe, RecipeBucket, RecipeIngredient,
+                            RecipeSignature)
+
+# Порог сходства, с которого рецепты почти наверняка попадают
+# в общую корзину, около (1 / BANDS) ** (1 / ROWS) = 0.37
+BANDS = 20
+ROWS = 3
+PERMUTATIONS = BANDS * ROWS
+PRIME = (1 << 61) - 1
+EMPTY = PRIME
+
+_rng = random.Random(20230601)
+HASHES = [(_rng.randrange(1, PRIME), _rng.randrange(0, PRIME))
+          for _ in range(PERMUTATIONS)]
+
+
+def features(ingredients, tags):
+    '''Ингредиенты и теги в одном пространстве целых чисел'''
+    return {2 * pk for pk in ingredients} | {2 * pk + 1 for pk in tags}
+
+
+def minhash(items):
+    '''Сигнатура: минимум каждой из PERMUTATIONS хэш-функций'''
+    if not items:
+        return array('Q', [EMPTY] * PERMUTATIONS)
+    return array('Q', (min((a * item + b) % PRIME for item in items)
+                       for a, b in HASHES))
+
+
+def band_buckets(signature):
+    '''Хэш каждой полосы из ROWS значений сигнатуры'''
+    return [
+        int.from_bytes(blake2b(signature[band * ROWS:(band + 1) * ROWS]
+                               .tobytes(), digest_size=8).digest(),
+                       'big', signed=True)
+        for band in range(BANDS)
+    ]
+
+
+def similarity(first, second):
+    '''Оценка коэффициента Жаккара по доле совпавших значений'''
+    return sum(a == b for a, b in zip(first, second)) / PERMUTATIONS
+
+
+def load_features(ids):
+    ingredients = {pk: [] for pk in ids}
+    tags = {pk: [] for pk in ids}
+    for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=ids).values_list('recipe_id', 'ingredient_id'):
+        ingredients[recipe_id].append(ingredient_id)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+            recipe_id__in=ids).values_list('recipe_id', 'tag_id'):
+        tags[recipe_id].append(tag_id)
+    return {pk: features(ingredients[pk], tags[pk]) for pk in ids}
+
+
+def update_signatures(ids=None, batch_size=500):
+    '''
+    Пересчитывает сигнатуры и корзины LSH рецептов с указанными id
+    (или всех) и возвращает число обработанных рецептов.
+    '''
+    recipes = Recipe.objects.order_by('pk').values_list('pk', flat=True)
+    if ids is not None:
+        recipes = recipes.filter(pk__in=ids)
+    updated = last_pk = 0
+    while True:
+        batch = list(recipes.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return updated
+        signatures, buckets = [], []
+        for recipe_id, items in load_features(batch).items():
+            signature = minhash(items)
+            signatures.append(RecipeSignature(
+                recipe_id=recipe_id, signature=signature.tobytes()))
+            if not items:
+                # Пустые рецепты не похожи ни на что
+                continue
+            buckets.extend(
+                RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+                for band, bucket in enumerate(band_buckets(signature)))
+        with transaction.atomic():
+            RecipeSignature.objects.bulk_create(
+                signatures, update_conflicts=True,
+                unique_fields=('recipe',), update_fields=('signature',))
+            RecipeBucket.objects.filter(recipe_id__in=batch).delete()
+            RecipeBucket.objects.bulk_create(buckets)
+        updated += len(batch)
+        last_pk = batch[-1]
+
+
+def get_signature(recipe_id):
+    '''
+    Сохраненная сигнатура рецепта. Если ее еще нет, она считается
+    в памяти: сохраняют сигнатуры только запись рецепта и rebuild_similar.
+    '''
+    row = RecipeSignature.objects.filter(recipe_id=recipe_id).first()
+    if row is None:
+        return minhash(load_features((recipe_id,))[recipe_id])
+    return array('Q', bytes(row.signature))
+
+
+def similar_recipe_ids(recipe_id, limit):
+    '''
+    Похожие рецепты: кандидаты из тех же корзин LSH, отсортированные
+    по оценке сходства сигнатур. Полный перебор рецептов не нужен.
+    '''
+    signature = get_signature(recipe_id)
+    lookup = reduce(or_, (Q(band=band, bucket=bucket) for band, bucket
+                          in enumerate(band_buckets(signature))))
+    candidates = (RecipeBucket.objects.filter(lookup)
+                  .exclude(recipe_id=recipe_id)
+                  .values('recipe_id').distinct()
+                  [:getattr(settings, 'SIMILAR_CANDIDATES_LIMIT', 1000)])
+    scored = [
+        (similarity(signature, array('Q', bytes(other))), pk)
+        for pk, other in RecipeSignature.objects.filter(
+            recipe_id__in=candidates).values_list('recipe_id', 'signature')
+    ]
+    scored.sort(key=lambda row: (-row[0], -row[1]))
+    return [pk for _, pk in scored[:limit]]
@@ -0,0 +1,74 @@
+from io import StringIO
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+
+class APITestCase(TestCase):
+    '''Общие данные: пользователи, теги, ингредиенты и рецепты'''
+
+    RECIPES = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{number}@example.org', username=f'user{number}',
+                first_name='Имя', last_name='Фамилия', password='password')
+            for number in range(4)
+        ]
+        cls.user = cls.users[0]
+        cls.tags = [Tag.objects.create(name=f'Тег {number}',
+                                       color=f'#00000{number}',
+                                       slug=f'tag{number}')
+                    for number in range(3)]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(10)
+        ]
+        cls.recipes = []
+        for number in range(cls.RECIPES):
+            cls.recipes.append(cls.create_recipe(
+                cls.users[1 + number % 3],
+                ingredients=cls.ingredients[number % 7:number % 7 + 3],
+                tags=cls.tags[number % 3:number % 3 + 2]))
+        for author in cls.users[1:]:
+            Follow.objects.create(user=cls.user, author=author)
+        for recipe in cls.recipes[::2]:
+            Favourite.objects.create(user=cls.user, recipe=recipe)
+        for recipe in cls.recipes[::3]:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        call_command('rebuild_counters', stdout=StringIO())
+
+    @classmethod
+    def create_recipe(cls, author, ingredients=(), tags=()):
+        recipe = Recipe.objects.create(
+            author=author, name=f'Рецепт {Recipe.objects.count()}',
+            image='recipes/test.png', text='Описание', cooking_time=10)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients)
+        recipe.tags.set(tags)
+        return recipe
+
+    def setUp(self):
+        caches['default'].clear()
+        token_cache.clear()
+        self.anonymous = APIClient()
+        self.client = self.client_for(self.user)
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
@@ -0,0 +1,116 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from api.tests.base import APITestCase
+from recipes.models import Favourite, Recipe, ShoppingCart
+from users.models import User
+
+
+class BatchListsTest(APITestCase):
+    '''Пакетное добавление и удаление и счетчики рецептов'''
+
+    def counters(self, recipes, field):
+        return dict(Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in recipes]
+        ).values_list('pk', field))
+
+    def assert_counters_match(self):
+        # Без расхождений команда ничего не бросает
+        call_command('rebuild_counters', '--check', stdout=StringIO())
+
+    def test_batch_add_and_remove(self):
+        for model, path in ((Favourite, 'favorite'),
+                            (ShoppingCart, 'shopping_cart')):
+            with self.subTest(path=path):
+                present = model.objects.filter(user=self.user).first().recipe
+                missing = [recipe for recipe in self.recipes
+                           if not model.objects.filter(
+                               user=self.user, recipe=recipe).exists()][:2]
+                recipes = [present, *missing]
+                ids = [recipe.pk for recipe in recipes]
+                before = self.counters(recipes, model.counter_field)
+                response = self.client.post(
+                    f'/api/recipes/{path}/', {'ids': [*ids, 999999]},
+                    format='json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [row['status'] for row in response.data['results']],
+                    ['exists', 'added', 'added', 'not_found'])
+                after = self.counters(recipes, model.counter_field)
+                self.assertEqual(after[present.pk], before[present.pk])
+                for recipe in missing:
+                    self.assertEqual(after[recipe.pk], before[recipe.pk] + 1)
+                self.assert_counters_match()
+
+                response = self.client.delete(
+                    f'/api/recipes/{path}/', {'ids': ids[1:]}, format='json')
+                self.assertEqual(
+                    [row['status'] for row in response.data['results']],
+                    ['removed', 'removed'])
+                response = self.client.delete(
+                    f'/api/recipes/{path}/', {'ids': ids[1:]}, format='json')
+                self.assertEqual(
+                    [row['status'] for row in response.data['results']],
+                    ['not_in_list', 'not_in_list'])
+                self.assertEqual(self.counters(recipes, model.counter_field),
+                                 before)
+                self.assert_counters_match()
+
+    def test_single_and_batch_keep_counters(self):
+        recipe = next(recipe for recipe in self.recipes
+                      if not Favourite.objects.filter(
+                          user=self.user, recipe=recipe).exists())
+        url = f'/api/recipes/{recipe.pk}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        response = self.client.post('/api/recipes/favorite/',
+                                    {'ids': [recipe.pk]}, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'exists')
+        self.assert_counters_match()
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assert_counters_match()
+
+    def test_validation(self):
+        for ids in ([], [0], list(range(1, 102))):
+            response = self.client.post('/api/recipes/favorite/',
+                                        {'ids': ids}, format='json')
+            self.assertEqual(response.status_code, 400, ids)
+        response = self.anonymous.post('/api/recipes/favorite/',
+                                       {'ids': [1]}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_counters_do_not_go_negative(self):
+        # Строки, созданные в обход API (админка), счетчики не меняют
+        recipe = self.recipes[0]
+        Recipe.objects.filter(pk=recipe.pk).update(favourites_count=0)
+        url = f'/api/recipes/{recipe.pk}/favorite/'
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        Favourite.objects.create(user=self.user, recipe=recipe)
+        response = self.client.delete('/api/recipes/favorite/',
+                                      {'ids': [recipe.pk]}, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'removed')
+        self.assertEqual(self.counters([recipe], 'favourites_count'),
+                         {recipe.pk: 0})
+
+        author = self.users[1]
+        recipe = self.create_recipe(author)
+        User.objects.filter(pk=author.pk).update(recipes_count=0)
+        response = self.client_for(author).delete(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 204)
+        author.refresh_from_db()
+        self.assertEqual(author.recipes_count, 0)
+
+    def test_unsubscribe(self):
+        author = self.users[1]
+        url = f'/api/users/{author.pk}/subscribe/'
+        User.objects.filter(pk=author.pk).update(followers_count=0)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 0)
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 0)
@@ -0,0 +1,77 @@
+import csv
+import json
+from io import StringIO
+
+from django.db.models import Count
+
+from api.tests.base import APITestCase
+from recipes.models import RecipeIngredient
+
+
+class ShoppingCartExportTest(APITestCase):
+    '''Выгрузка списка покупок в разных форматах'''
+
+    url = '/api/recipes/download_shopping_cart/'
+
+    def setUp(self):
+        super().setUp()
+        # Количество в рецептах base всегда 1
+        self.amounts = dict(
+            RecipeIngredient.objects
+            .filter(recipe__shopping_cart__user=self.user)
+            .values_list('ingredient__name')
+            .annotate(total=Count('pk')))
+
+    def download(self, file_format):
+        response = self.client.get(self.url, {'file_format': file_format})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename=shopping_list.{file_format}')
+        return response, b''.join(response.streaming_content)
+
+    def test_txt(self):
+        response, body = self.download('txt')
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; charset=utf-8')
+        lines = body.decode().splitlines()
+        self.assertEqual(lines[0], 'Список покупок:')
+        self.assertEqual(
+            lines[1:],
+            [f'{name} - {total}/г'
+             for name, total in sorted(self.amounts.items())])
+
+    def test_csv(self):
+        response, body = self.download('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(StringIO(body.decode())))
+        self.assertEqual({row['name']: int(row['amount']) for row in rows},
+                         self.amounts)
+        self.assertEqual({row['measurement_unit'] for row in rows}, {'г'})
+
+    def test_json(self):
+        response, body = self.download('json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(
+            {item['name']: item['amount'] for item in json.loads(body)},
+            self.amounts)
+
+    def test_pdf(self):
+        response, body = self.download('pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(body.startswith(b'%PDF-'))
+        self.assertTrue(body.rstrip().endswith(b'%%EOF'))
+        self.assertIn(b'/Type /Page', body)
+
+    def test_empty_cart(self):
+        response = self.client_for(self.users[1]).get(
+            self.url, {'file_format': 'json'})
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+    def test_unknown_format(self):
+        response = self.client.get(self.url, {'file_format': 'docx'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_anonymous(self):
+        response = self.anonymous.get(self.url)
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,106 @@
+import shutil
+import tempfile
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.feed import publish, rebuild_feeds
+from api.tests.base import APITestCase
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow
+
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcS'
+         'JAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg==')
+
+
+class FeedTest(APITestCase):
+    '''Лента подписок: рассылка при записи, чтение с курсором'''
+
+    def setUp(self):
+        super().setUp()
+        rebuild_feeds()
+
+    def expected(self, user):
+        return list(Recipe.objects.filter(author__following__user=user)
+                    .order_by('-date', '-id').values_list('id', flat=True))
+
+    def walk(self, client, limit):
+        '''id рецептов всех страниц ленты и число запросов на страницу'''
+        url, ids, queries = f'/api/recipes/feed/?limit={limit}', [], set()
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), limit)
+            queries.add(len(context))
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return ids, queries
+
+    def test_pages(self):
+        self.client.get('/api/recipes/feed/', {'limit': 1})
+        ids, queries = self.walk(self.client, 7)
+        self.assertEqual(ids, self.expected(self.user))
+        self.assertEqual(len(queries), 1)
+
+    def test_publish(self):
+        author = self.users[1]
+        recipe = self.create_recipe(author, self.ingredients[:2],
+                                    self.tags[:1])
+        publish(recipe)
+        self.assertEqual(
+            set(FeedEntry.objects.filter(recipe=recipe)
+                .values_list('user_id', flat=True)),
+            set(Follow.objects.filter(author=author)
+                .values_list('user_id', flat=True)))
+        feed = self.client.get('/api/recipes/feed/').data['results']
+        self.assertEqual(feed[0]['id'], recipe.pk)
+
+    def test_create_recipe_fans_out(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        author = self.users[1]
+        with override_settings(MEDIA_ROOT=media):
+            response = self.client_for(author).post('/api/recipes/', {
+                'name': 'Новый рецепт', 'text': 'Описание',
+                'cooking_time': 5, 'image': IMAGE,
+                'tags': [self.tags[0].pk],
+                'ingredients': [{'id': self.ingredients[0].pk, 'amount': 2}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user, recipe_id=response.data['id']).exists())
+
+    def test_subscribe_and_unsubscribe(self):
+        reader, author = self.users[3], self.users[1]
+        client = self.client_for(reader)
+        self.assertEqual(
+            client.post(f'/api/users/{author.pk}/subscribe/').status_code,
+            201)
+        ids, _ = self.walk(client, 10)
+        self.assertEqual(ids, self.expected(reader))
+        self.assertTrue(ids)
+        self.assertEqual(
+            client.delete(f'/api/users/{author.pk}/subscribe/').status_code,
+            204)
+        self.assertFalse(FeedEntry.objects.filter(user=reader).exists())
+        self.assertEqual(client.get('/api/recipes/feed/').data['results'],
+                         [])
+
+    def test_prolific_authors_are_read_on_request(self):
+        prolific = self.users[1]
+        with override_settings(FEED_FANOUT_MAX_FOLLOWERS=1):
+            recipe = self.create_recipe(prolific, self.ingredients[:1])
+            publish(recipe)
+            self.assertFalse(FeedEntry.objects.filter(recipe=recipe).exists())
+            ids, _ = self.walk(self.client, 7)
+        self.assertEqual(ids, self.expected(self.user))
+        self.assertEqual(ids[0], recipe.pk)
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_errors(self):
+        self.assertEqual(
+            self.anonymous.get('/api/recipes/feed/').status_code, 401)
+        self.assertEqual(self.client.get(
+            '/api/recipes/feed/', {'cursor': 'broken'}).status_code, 404)
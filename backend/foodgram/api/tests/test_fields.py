@@ -0,0 +1,68 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.base import APITestCase
+
+
+class DynamicFieldsTest(APITestCase):
+    '''Выбор полей ответа параметрами ?fields= и ?omit='''
+
+    def get(self, params, client=None, url='/api/recipes/'):
+        with CaptureQueriesContext(connection) as context:
+            response = (client or self.anonymous).get(url, params)
+        return response, [query['sql'] for query in context]
+
+    def test_fields(self):
+        response, queries = self.get(
+            {'fields': 'id,name,author.username', 'limit': 5})
+        self.assertEqual(response.status_code, 200)
+        for recipe in response.data['results']:
+            self.assertEqual(set(recipe), {'id', 'name', 'author'})
+            self.assertEqual(set(recipe['author']), {'username'})
+
+    def test_omit(self):
+        response, _ = self.get({'omit': 'text,ingredients,author.email'})
+        recipe = response.data['results'][0]
+        self.assertNotIn('text', recipe)
+        self.assertNotIn('ingredients', recipe)
+        self.assertIn('tags', recipe)
+        self.assertNotIn('email', recipe['author'])
+        self.assertIn('username', recipe['author'])
+
+    def test_unknown_fields(self):
+        for params in ({'fields': 'id,bogus'}, {'fields': 'author.bogus'},
+                       {'fields': 'tags.name'}, {'omit': 'bogus'},
+                       {'omit': 'author.bogus'}):
+            with self.subTest(params=params):
+                response, _ = self.get(params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(set(response.data), set(params))
+        response, _ = self.get({'fields': 'bogus'},
+                               url=f'/api/recipes/{self.recipes[0].pk}/')
+        self.assertEqual(response.status_code, 400)
+        response, _ = self.get({'fields': 'bogus'}, url='/api/users/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_dropped_fields_skip_queries(self):
+        # Первый запрос заполняет кэш токенов
+        _, full = self.get({'limit': 1}, self.client)
+        _, full = self.get({'limit': 5}, self.client)
+        response, short = self.get({'fields': 'id,name', 'limit': 5},
+                                   self.client)
+        self.assertEqual(response.status_code, 200)
+        # Без prefetch тегов, автора и ингредиентов
+        self.assertEqual(len(full) - len(short), 3)
+        self.assertFalse(any('recipes_recipeingredient' in sql
+                             or 'users_user' in sql for sql in short))
+        recipes_query = short[-1]
+        self.assertNotIn('recipes_favourite', recipes_query)
+        self.assertNotIn('recipes_shoppingcart', recipes_query)
+        self.assertNotIn('"text"', recipes_query)
+
+    def test_users_without_is_subscribed(self):
+        self.get({}, self.client, '/api/users/')
+        _, full = self.get({}, self.client, '/api/users/')
+        _, short = self.get({'fields': 'id,username'}, self.client,
+                            '/api/users/')
+        self.assertIn('users_follow', full[-1])
+        self.assertNotIn('users_follow', short[-1])
@@ -0,0 +1,80 @@
+from collections import defaultdict
+
+from api.search import RecipeIngredientIndex
+from api.tests.base import APITestCase
+from recipes.models import Recipe, RecipeIngredient
+
+
+class RecipeIngredientIndexTest(APITestCase):
+    '''Обратный индекс ингредиентов и поиск ?have='''
+
+    def expected(self, have):
+        '''Ранжирование по базе, без индекса'''
+        recipes = defaultdict(set)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+                'recipe_id', 'ingredient_id'):
+            recipes[recipe_id].add(ingredient_id)
+        ranked = [
+            (recipe_id, len(ingredients & have),
+             len(ingredients - have))
+            for recipe_id, ingredients in recipes.items()
+            if ingredients & have
+        ]
+        ranked.sort(key=lambda row: (-row[1], row[2], -row[0]))
+        return ranked
+
+    def have(self, *positions):
+        return {self.ingredients[position].pk for position in positions}
+
+    def test_rank_matches_database(self):
+        index = RecipeIngredientIndex()
+        for have in (self.have(0), self.have(1, 2, 3), self.have(8, 9),
+                     self.have(*range(10))):
+            self.assertEqual(index.rank(have), self.expected(have))
+
+    def test_incremental_changes(self):
+        index = RecipeIngredientIndex()
+        have = self.have(0, 4, 9)
+        index.rank(have)
+        built_at = index.built_at
+        edited, deleted = self.recipes[0], self.recipes[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.filter(recipe=edited).delete()
+            RecipeIngredient.objects.create(
+                recipe=edited, ingredient=self.ingredients[9], amount=1)
+            index.changed(edited.pk)
+            deleted.delete()
+            index.changed(deleted.pk)
+            created = self.create_recipe(
+                self.users[1], ingredients=self.ingredients[3:5])
+            index.changed(created.pk)
+        ranked = index.rank(have)
+        self.assertEqual(index.built_at, built_at)
+        self.assertEqual(ranked, self.expected(have))
+        self.assertEqual(ranked, RecipeIngredientIndex().rank(have))
+        self.assertIn((edited.pk, 1, 0), ranked)
+        self.assertNotIn(deleted.pk, [row[0] for row in ranked])
+
+    def test_have_filter(self):
+        have = self.have(0, 1)
+        response = self.anonymous.get('/api/recipes/', {
+            'have': ','.join(map(str, have)), 'limit': Recipe.objects.count()
+        })
+        self.assertEqual(response.status_code, 200)
+        expected = {recipe_id: (found, missing)
+                    for recipe_id, found, missing in self.expected(have)}
+        results = response.data['results']
+        self.assertEqual({recipe['id'] for recipe in results}, set(expected))
+        keys = [expected[recipe['id']] for recipe in results]
+        self.assertEqual(
+            keys, sorted(keys, key=lambda key: (-key[0], key[1])))
+        for recipe in results:
+            self.assertEqual(recipe['missing_count'],
+                             expected[recipe['id']][1])
+
+    def test_have_validation(self):
+        response = self.anonymous.get('/api/recipes/', {'have': '1,a'})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(
+            'missing_count',
+            self.anonymous.get('/api/recipes/').data['results'][0])
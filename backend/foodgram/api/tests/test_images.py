@@ -0,0 +1,62 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from api.tests.base import APITestCase
+from api.tests.test_feed import IMAGE
+
+
+class ImageVariantsTest(APITestCase):
+    '''Ссылки на уменьшенные копии фото рецепта'''
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media, IMAGE_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def variants(self, recipe_id):
+        response = self.anonymous.get(f'/api/recipes/{recipe_id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['image_variants']
+
+    def test_missing_variants_fall_back_to_original(self):
+        # Фото из base загружено "до" появления копий
+        variants = self.variants(self.recipes[0].pk)
+        self.assertEqual(variants['thumbnail'], variants['original'])
+        self.assertEqual(variants['detail'], variants['original'])
+
+    def create(self, process=True):
+        '''Рецепт с фото; process=False - без фоновой обработки'''
+        with self.captureOnCommitCallbacks(execute=process):
+            response = self.client_for(self.users[1]).post('/api/recipes/', {
+                'name': 'С фото', 'text': 'Описание', 'cooking_time': 5,
+                'image': IMAGE, 'tags': [self.tags[0].pk],
+                'ingredients': [{'id': self.ingredients[0].pk, 'amount': 2}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def test_created_variants(self):
+        variants = self.variants(self.create())
+        self.assertTrue(variants['thumbnail'].endswith('_thumbnail.jpg'))
+        self.assertTrue(variants['detail'].endswith('_detail.jpg'))
+        for url in variants.values():
+            self.assertTrue(url.startswith('http://testserver/media/'))
+
+    def test_backfill_command(self):
+        recipe_id = self.create(process=False)
+        variants = self.variants(recipe_id)
+        self.assertEqual(variants['thumbnail'], variants['original'])
+        # У рецептов из base файла фото нет: ошибка пишется в лог,
+        # остальные изображения обрабатываются
+        with self.assertLogs('api.images', 'ERROR'):
+            call_command('make_image_variants', stdout=StringIO())
+        variants = self.variants(recipe_id)
+        self.assertTrue(variants['thumbnail'].endswith('_thumbnail.jpg'))
+        self.assertTrue(variants['detail'].endswith('_detail.jpg'))
@@ -0,0 +1,49 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from api.tests.base import APITestCase
+from recipes.models import Recipe
+
+
+class RecipeOrderingTest(APITestCase):
+    '''Сортировки ?ordering= списка рецептов'''
+
+    def ids(self, ordering, limit=None):
+        response = self.anonymous.get(
+            '/api/recipes/', {'ordering': ordering, 'limit': limit or 100})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_popular(self):
+        call_command('refresh_scores', stdout=StringIO())
+        ids = self.ids('popular')
+        scores = dict(Recipe.objects.values_list('id', 'score'))
+        self.assertEqual(len(ids), self.RECIPES)
+        self.assertEqual([scores[pk] for pk in ids],
+                         sorted(scores.values(), reverse=True))
+        # В избранном и в списке покупок одновременно
+        self.assertIn(ids[0], {recipe.pk for recipe in self.recipes[::6]})
+        self.assertEqual(scores[ids[-1]], 0)
+
+    def test_popular_new_recipe(self):
+        call_command('refresh_scores', stdout=StringIO())
+        recipe = self.create_recipe(self.users[1])
+        ids = self.ids('popular')
+        self.assertEqual(len(ids), self.RECIPES + 1)
+        scores = dict(Recipe.objects.values_list('id', 'score'))
+        # До refresh_scores рейтинг нулевой: первым среди нулевых
+        # как самый новый
+        unscored = [pk for pk in ids if not scores[pk]]
+        self.assertEqual(unscored[0], recipe.pk)
+
+    def test_newest_and_quickest(self):
+        self.assertEqual(self.ids('newest'), list(
+            Recipe.objects.order_by('-date', '-id')
+            .values_list('id', flat=True)))
+        Recipe.objects.filter(pk=self.recipes[5].pk).update(cooking_time=1)
+        self.assertEqual(self.ids('quickest', 1), [self.recipes[5].pk])
+
+    def test_unknown(self):
+        response = self.anonymous.get('/api/recipes/', {'ordering': 'bogus'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from api.tests.base import APITestCase
+from recipes.models import Recipe
+from users.models import User
+
+
+class CursorPaginationTest(APITestCase):
+    '''Курсорная пагинация ?pagination=cursor'''
+
+    TIED = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Рецепты группами по TIED с одинаковой датой, чтобы границы
+        # страниц попадали внутрь групп
+        now = timezone.now()
+        for number, recipe in enumerate(
+                Recipe.objects.order_by('id').only('id')):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                date=now - timedelta(hours=number // cls.TIED))
+
+    def walk(self, url, key='next'):
+        '''id объектов всех страниц по ссылкам next или previous'''
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            pages.append([item['id'] for item in response.data['results']])
+            last, url = response, response.data[key]
+        return pages, last
+
+    def test_recipes_with_tied_dates(self):
+        expected = list(Recipe.objects.order_by('-date', '-id')
+                        .values_list('id', flat=True))
+        for limit in (1, 3, 4, 7, self.TIED):
+            with self.subTest(limit=limit):
+                pages, last = self.walk(
+                    f'/api/recipes/?pagination=cursor&limit={limit}')
+                self.assertEqual(sum(pages, []), expected)
+                self.assertTrue(all(len(page) == limit
+                                    for page in pages[:-1]))
+                back, _ = self.walk(last.data['previous'], 'previous')
+                self.assertEqual(sum(reversed(back), []),
+                                 expected[:-len(pages[-1])])
+
+    def test_recipes_with_filter(self):
+        author = self.users[1]
+        pages, _ = self.walk(
+            f'/api/recipes/?pagination=cursor&limit=4&author={author.pk}')
+        self.assertEqual(
+            sum(pages, []),
+            list(Recipe.objects.filter(author=author)
+                 .order_by('-date', '-id').values_list('id', flat=True)))
+
+    def test_users(self):
+        pages, _ = self.walk('/api/users/?pagination=cursor&limit=3')
+        self.assertEqual(sum(pages, []), list(
+            User.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_ranking_params_rejected(self):
+        for params in ('search=рецепт', f'have={self.ingredients[0].pk}',
+                       'ordering=quickest'):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    f'/api/recipes/?pagination=cursor&{params}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('pagination', response.data)
+                response = self.client.get(f'/api/recipes/?{params}')
+                self.assertEqual(response.status_code, 200)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            '/api/recipes/?pagination=cursor&cursor=bogus')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,31 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.base import APITestCase
+
+
+class RecipeListQueriesTest(APITestCase):
+    '''Число запросов списка рецептов не зависит от размера страницы'''
+
+    def assert_flat_queries(self, client):
+        # Первый запрос заполняет кэш токенов
+        client.get('/api/recipes/', {'limit': 1})
+        with CaptureQueriesContext(connection) as small:
+            response = client.get('/api/recipes/', {'limit': 6})
+        self.assertEqual(len(response.data['results']), 6)
+        with self.assertNumQueries(len(small)):
+            response = client.get('/api/recipes/', {'limit': 50})
+        self.assertEqual(len(response.data['results']), 50)
+
+    def test_anonymous(self):
+        self.assert_flat_queries(self.anonymous)
+
+    def test_authenticated(self):
+        self.assert_flat_queries(self.client)
+        response = self.client.get('/api/recipes/', {'limit': 50})
+        favourites = {recipe.pk for recipe in self.recipes[::2]}
+        for recipe in response.data['results']:
+            self.assertEqual(recipe['is_favorited'],
+                             recipe['id'] in favourites)
+            self.assertTrue(recipe['author']['is_subscribed'])
+            self.assertEqual(len(recipe['ingredients']), 3)
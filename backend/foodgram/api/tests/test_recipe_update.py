@@ -0,0 +1,79 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.base import APITestCase
+from recipes.models import RecipeIngredient
+
+
+class RecipeUpdateTest(APITestCase):
+    '''PATCH рецепта меняет только разницу в ингредиентах'''
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(
+            self.users[1], self.ingredients[:3], self.tags[:2])
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.author = self.client_for(self.users[1])
+
+    def rows(self):
+        return {row.ingredient_id: (row.pk, row.amount)
+                for row in RecipeIngredient.objects.filter(
+                    recipe=self.recipe)}
+
+    def patch(self, data):
+        with CaptureQueriesContext(connection) as context:
+            response = self.author.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response, [query['sql'] for query in context
+                          if 'recipes_recipeingredient' in query['sql']
+                          and not query['sql'].startswith('SELECT')]
+
+    def test_diff(self):
+        first, second, third = self.ingredients[:3]
+        fourth = self.ingredients[3]
+        before = self.rows()
+        response, writes = self.patch({'ingredients': [
+            {'id': first.pk, 'amount': 1},
+            {'id': second.pk, 'amount': 5},
+            {'id': fourth.pk, 'amount': 7},
+        ]})
+        after = self.rows()
+        # Неизмененная строка сохраняет id и не перезаписывается
+        self.assertEqual(after[first.pk], before[first.pk])
+        self.assertEqual(after[second.pk], (before[second.pk][0], 5))
+        self.assertNotIn(third.pk, after)
+        self.assertEqual(after[fourth.pk][1], 7)
+        self.assertEqual(len(writes), 3)
+        self.assertTrue(any(sql.startswith('DELETE') for sql in writes))
+        self.assertTrue(any(sql.startswith('UPDATE') for sql in writes))
+        self.assertTrue(any(sql.startswith('INSERT') for sql in writes))
+        self.assertEqual(
+            {item['id']: item['amount']
+             for item in response.data['ingredients']},
+            {first.pk: 1, second.pk: 5, fourth.pk: 7})
+
+    def test_same_ingredients(self):
+        before = self.rows()
+        _, writes = self.patch({'ingredients': [
+            {'id': pk, 'amount': amount}
+            for pk, (_, amount) in before.items()]})
+        self.assertEqual(writes, [])
+        self.assertEqual(self.rows(), before)
+
+    def test_without_ingredients_and_tags(self):
+        before = self.rows()
+        _, writes = self.patch({'name': 'Новое название'})
+        self.assertEqual(writes, [])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Новое название')
+        self.assertEqual(self.rows(), before)
+        self.assertEqual(set(self.recipe.tags.all()), set(self.tags[:2]))
+
+    def test_tags(self):
+        self.patch({'tags': [self.tags[2].pk]})
+        self.assertEqual(list(self.recipe.tags.all()), [self.tags[2]])
+
+    def test_not_author(self):
+        response = self.client.patch(self.url, {'name': 'Чужой'},
+                                     format='json')
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,69 @@
+from api.tests.base import APITestCase
+
+
+class ReferenceCacheTest(APITestCase):
+    '''ETag и 304 для тегов и ингредиентов, сброс после изменения'''
+
+    def get(self, url, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.anonymous.get(url, **headers)
+
+    def assert_not_modified(self, url):
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        with self.assertNumQueries(0):
+            cached = self.get(url, etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+        self.assertEqual(self.get(url, '"other"').status_code, 200)
+        return response
+
+    def test_not_modified(self):
+        tag, ingredient = self.tags[0], self.ingredients[0]
+        for url in ('/api/tags/', f'/api/tags/{tag.pk}/',
+                    '/api/ingredients/', '/api/ingredients/?name=ингр',
+                    f'/api/ingredients/{ingredient.pk}/'):
+            with self.subTest(url=url):
+                self.assert_not_modified(url)
+
+    def test_tag_change(self):
+        tag = self.tags[0]
+        for url in ('/api/tags/', f'/api/tags/{tag.pk}/'):
+            with self.subTest(url=url):
+                etag = self.assert_not_modified(url)['ETag']
+                tag.name = f'{tag.name} {url}'
+                tag.save()
+                response = self.get(url, etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                self.assertIn(tag.name, response.content.decode())
+
+    def test_ingredient_change(self):
+        url = '/api/ingredients/?name=ингр'
+        etag = self.assert_not_modified(url)['ETag']
+        ingredient = self.ingredients[0]
+        ingredient.name = 'Ингредиент новый'
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.save()
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Ингредиент новый',
+                      [item['name'] for item in response.json()])
+
+    def test_admin_edit(self):
+        admin = self.users[3]
+        admin.is_staff = admin.is_superuser = True
+        admin.save()
+        tag = self.tags[1]
+        etag = self.assert_not_modified('/api/tags/')['ETag']
+        self.client.force_login(admin)
+        response = self.client.post(
+            f'/admin/recipes/tag/{tag.pk}/change/',
+            {'name': 'Изменен', 'color': tag.color, 'slug': tag.slug})
+        self.assertEqual(response.status_code, 302)
+        response = self.get('/api/tags/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Изменен', response.content.decode())
@@ -0,0 +1,71 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import override_settings
+
+from api.replicas import ReplicaRouter, pin_key
+from api.tests.base import APITestCase
+
+
+# Реплика указывает на ту же базу: проверяется выбор маршрута,
+# а не содержимое баз
+@override_settings(REPLICA_DATABASES=['default'])
+class ReplicaRoutingTest(APITestCase):
+    '''Чтение с реплики и закрепление за основной базой после записи'''
+
+    def replica_reads(self, client, method, url, **kwargs):
+        '''Ответ и число чтений, отправленных на реплику'''
+        aliases = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            alias = db_for_read(router, model, **hints)
+            aliases.append(alias)
+            return alias
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', record):
+            response = getattr(client, method)(url, **kwargs)
+        return response, aliases.count('default')
+
+    def test_safe_requests_read_replica(self):
+        recipe = self.recipes[0]
+        for url in ('/api/recipes/', f'/api/recipes/{recipe.pk}/',
+                    '/api/tags/', f'/api/ingredients/{recipe.pk}/',
+                    '/api/users/'):
+            with self.subTest(url=url):
+                response, reads = self.replica_reads(self.client, 'get', url)
+                self.assertEqual(response.status_code, 200)
+                self.assertGreater(reads, 0)
+
+    def test_other_requests_read_primary(self):
+        for method, url in (('get', '/api/users/me/'),
+                            ('get', '/api/users/subscriptions/'),
+                            ('post', f'/api/recipes/{self.recipes[1].pk}/'
+                                     'favorite/')):
+            with self.subTest(url=url):
+                response, reads = self.replica_reads(self.client, method, url)
+                self.assertLess(response.status_code, 300)
+                self.assertEqual(reads, 0)
+
+    def test_writer_sticks_to_primary(self):
+        url = f'/api/recipes/{self.recipes[1].pk}/favorite/'
+        self.replica_reads(self.client, 'post', url)
+        self.assertTrue(caches['default'].get(pin_key(self.user.pk)))
+        _, reads = self.replica_reads(self.client, 'get', '/api/recipes/')
+        self.assertEqual(reads, 0)
+        _, reads = self.replica_reads(self.anonymous, 'get', '/api/recipes/')
+        self.assertGreater(reads, 0)
+        caches['default'].delete(pin_key(self.user.pk))
+        _, reads = self.replica_reads(self.client, 'get', '/api/recipes/')
+        self.assertGreater(reads, 0)
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(None))
+        self.assertEqual(router.db_for_write(None), 'default')
+        self.assertIs(router.allow_migrate('default', 'recipes'), False)
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas(self):
+        _, reads = self.replica_reads(self.anonymous, 'get', '/api/recipes/')
+        self.assertEqual(reads, 0)
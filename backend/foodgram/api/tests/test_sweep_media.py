@@ -0,0 +1,92 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import override_settings
+
+from api.images import VARIANTS, variant_name
+from api.tests.base import APITestCase
+from api.tests.test_feed import IMAGE
+from recipes.models import ImageBlob, Recipe
+
+
+class SweepMediaTest(APITestCase):
+    '''Удаление файлов с нулевым счетчиком ссылок'''
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media, IMAGE_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.storage = Recipe._meta.get_field('image').storage
+        self.author = self.client_for(self.users[1])
+
+    def create(self, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author.post('/api/recipes/', {
+                'name': name, 'text': 'Описание', 'cooking_time': 5,
+                'image': IMAGE, 'tags': [self.tags[0].pk],
+                'ingredients': [{'id': self.ingredients[0].pk, 'amount': 2}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Recipe.objects.get(pk=response.data['id'])
+
+    def files(self, name):
+        return [name, *(variant_name(name, variant) for variant in VARIANTS)]
+
+    def sweep(self, *args):
+        stdout = StringIO()
+        call_command('sweep_media', '--grace=0', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_refcount(self):
+        first, second = self.create('Первый'), self.create('Второй')
+        # Одинаковое фото хранится одним файлом
+        self.assertEqual(first.image.name, second.image.name)
+        name = first.image.name
+        self.assertEqual(ImageBlob.objects.get(name=name).refcount, 2)
+        self.assertTrue(all(map(self.storage.exists, self.files(name))))
+
+        self.author.delete(f'/api/recipes/{first.pk}/')
+        self.assertEqual(ImageBlob.objects.get(name=name).refcount, 1)
+        self.sweep()
+        self.assertTrue(all(map(self.storage.exists, self.files(name))))
+
+        self.author.delete(f'/api/recipes/{second.pk}/')
+        self.assertEqual(ImageBlob.objects.get(name=name).refcount, 0)
+        self.sweep('--dry-run')
+        self.assertTrue(all(map(self.storage.exists, self.files(name))))
+        self.assertIn('Файлов без ссылок: 3', self.sweep())
+        self.assertFalse(any(map(self.storage.exists, self.files(name))))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_grace(self):
+        recipe = self.create('Первый')
+        self.author.delete(f'/api/recipes/{recipe.pk}/')
+        call_command('sweep_media', stdout=StringIO())
+        self.assertTrue(self.storage.exists(recipe.image.name))
+
+    def test_dry_run_does_not_write(self):
+        recipe = self.create('Первый')
+        ImageBlob.objects.filter(name=recipe.image.name).update(refcount=5)
+        blobs = list(ImageBlob.objects.values_list('name', 'refcount'))
+        self.sweep('--dry-run')
+        self.assertEqual(
+            list(ImageBlob.objects.values_list('name', 'refcount')), blobs)
+        # Без --dry-run счетчик сверяется с рецептами
+        self.sweep()
+        self.assertEqual(
+            ImageBlob.objects.get(name=recipe.image.name).refcount, 1)
+
+    def test_untracked_files(self):
+        recipe = self.create('Первый')
+        stray = self.storage.save('recipes/temp.png', ContentFile(b'png'))
+        self.assertEqual(self.sweep('--dry-run').splitlines()[0], stray)
+        self.assertTrue(self.storage.exists(stray))
+        self.sweep()
+        self.assertFalse(self.storage.exists(stray))
+        self.assertTrue(self.storage.exists(recipe.image.name))
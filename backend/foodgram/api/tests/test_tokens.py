@@ -0,0 +1,80 @@
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache_key
+from api.tests.base import APITestCase
+
+
+class TokenCacheTests:
+    '''Кэш токенов и его сброс при выходе и изменении пользователя'''
+
+    def setUp(self):
+        super().setUp()
+        self.key = Token.objects.get(user=self.user).key
+
+    def assert_rejected(self):
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_cached_authentication(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        # Только список тегов, без Token join User
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout(self):
+        self.client.get('/api/users/me/')
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_rejected()
+
+    def test_deactivation(self):
+        self.client.get('/api/users/me/')
+        self.user.is_active = False
+        self.user.save()
+        self.assert_rejected()
+
+    def test_password_survives_save(self):
+        self.client.get('/api/users/me/')
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'password', 'new_password': 'Secret-42x'})
+        self.assertEqual(response.status_code, 204)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('Secret-42x'))
+        self.assertIsNone(caches['default'].get(token_cache_key(self.key)))
+
+
+class LocalTokenCacheTest(TokenCacheTests, APITestCase):
+    '''Кэш процесса: в LocMemCache токены не попадают'''
+
+    def test_local_cache_is_not_shared(self):
+        self.client.get('/api/users/me/')
+        self.assertIsNone(caches['default'].get(token_cache_key(self.key)))
+
+
+class SharedTokenCacheTest(TokenCacheTests, APITestCase):
+    '''Общий для воркеров кэш'''
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        settings = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+        }})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        super().setUp()
+
+    def test_shared_entry(self):
+        self.client.get('/api/users/me/')
+        user_values, token_values = caches['default'].get(
+            token_cache_key(self.key))
+        self.assertNotIn('password', user_values)
+        self.assertEqual(user_values['id'], self.user.pk)
+        self.assertEqual(token_values['key'], self.key)
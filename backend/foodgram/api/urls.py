@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api.metrics import metrics_view
 from api.views import (IngredientViewSet, MyUserViewSet, RecipeViewSet,
                        TagViewSet)
 
@@ -17,4 +18,5 @@ router.register('users', MyUserViewSet, basename='users')
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics', metrics_view, name='metrics'),
 ]
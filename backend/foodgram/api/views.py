@@ -1,5 +1,9 @@
-from django.db.models.aggregates import Sum
-from django.http import HttpResponse
+from functools import partial
+
+from django.db import router, transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Sum
+from django.db.models.functions import Greatest
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
@@ -8,34 +12,76 @@ from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
 
-from api.filters import NameSearchFilter, RecipeFilter
-from api.pagination import CustomPagination
+from api.cache import VersionedCacheMixin
+from api.exporters import CHUNK_SIZE, EXPORTERS, FILE
+from api.feed import backfill, prune, timeline
+from api.filters import RecipeFilter
+from api.images import release
+from api.metrics import model_event
+from api.pagination import FeedPagination, TimelinePagination
 from api.permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
+from api.recommendations import recommend
+from api.replicas import ReplicaReadMixin
+from api.search import ingredient_index, recipe_index
+from api.similar import similar_recipe_ids
 from api.serializers import (FollowSerializer, IngredientSerializer,
                              MyUserSerializer, RecipeCreateSerializer,
-                             RecipeGetSerializer, RecipeIngredient,
-                             RecipeShowSerializer, TagSerializer)
+                             RecipeGetSerializer, RecipeIdsSerializer,
+                             RecipeIngredient, RecipeShowSerializer,
+                             TagSerializer)
 from recipes.models import Favourite, Ingredient, Recipe, ShoppingCart, Tag
 from users.models import Follow, User
 
 
-SHOP_LIST = 'Список покупок:'
-FILE = 'shopping_list.txt'
+def decrement(counter, count=1):
+    '''
+    Уменьшение счетчика без ухода ниже нуля: строки, созданные в админке,
+    счетчики не меняют, и без ограничения удаление через API упало бы
+    на CHECK положительного поля
+    '''
+    return Greatest(F(counter) - count, 0)
 
 
-class MyUserViewSet(UserViewSet):
+class MyUserViewSet(ReplicaReadMixin, UserViewSet):
     '''Вьюсет для пользователей и подписок'''
 
     queryset = User.objects.all()
     serializer_class = MyUserSerializer
-    pagination_class = CustomPagination
+    pagination_class = FeedPagination
+    cursor_ordering = ('id',)
+    replica_actions = ('list',)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if (self.action in ('list', 'retrieve') and user.is_authenticated
+                and 'is_subscribed' in MyUserSerializer.selected_fields(
+                    self.request)):
+            return queryset.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))))
+        return queryset
+
+    def with_recipes(self, queryset):
+        '''
+        Добавляет к авторам последние recipes_limit рецептов,
+        загруженные одним оконным запросом
+        '''
+        if 'recipes' not in FollowSerializer.selected_fields(self.request):
+            return queryset
+        recipes = Recipe.objects.order_by('-date', '-id')
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes[:int(recipes_limit)]
+        return queryset.prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='latest_recipes'))
 
     @action(detail=False,
             methods=['GET'],
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        queryset = self.with_recipes(
+            User.objects.filter(following__user=user).order_by('pk'))
         page = self.paginate_queryset(queryset)
         serializer = FollowSerializer(page,
                                       many=True,
@@ -56,49 +102,97 @@ class MyUserViewSet(UserViewSet):
             if Follow.objects.filter(author=author, user=user).exists():
                 return Response({'detail': 'Вы уже подписаны!'},
                                 status=status.HTTP_400_BAD_REQUEST)
-            Follow.objects.create(user=user, author=author)
+            with transaction.atomic():
+                Follow.objects.create(user=user, author=author)
+                User.objects.filter(id=id).update(
+                    followers_count=F('followers_count') + 1)
+                backfill(user, author)
+            model_event(Follow, 'created')
+            author = self.with_recipes(User.objects.filter(id=id)).get()
             serializer = FollowSerializer(author,
                                           context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if not Follow.objects.filter(user=user, author=author).exists():
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(user=user,
+                                               author=author).delete()
+            if deleted:
+                User.objects.filter(id=id).update(
+                    followers_count=decrement('followers_count', deleted))
+                prune(user, author)
+        if not deleted:
             return Response({'errors': 'Сначала нужно подписаться!'},
                             status=status.HTTP_400_BAD_REQUEST)
-        subscription = get_object_or_404(Follow, user=user, author=author)
-        subscription.delete()
+        model_event(Follow, 'deleted', deleted)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, VersionedCacheMixin,
+                        viewsets.ReadOnlyModelViewSet):
     '''Вьюсет ингредиентов'''
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAdminOrReadOnly,)
-    filter_backends = (NameSearchFilter,)
-    search_fields = ('^name',)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(self.search, request, *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        '''Поиск по индексу в памяти, без обращения к базе'''
+        name = request.query_params.get('name', '')
+        limit = request.query_params.get('limit', '')
+        limit = int(limit) if limit.isdigit() else None
+        return Response(ingredient_index.search(name, limit))
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     '''Вьюсет рецептов'''
 
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
-    pagination_class = CustomPagination
+    pagination_class = FeedPagination
+    cursor_ordering = ('-date', '-id')
+    cursor_excluded_params = ('search', 'have', 'ordering')
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     http_method_names = [
         m for m in viewsets.ModelViewSet.http_method_names if m not in ['PUT']
     ]
 
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            user = self.request.user
+            fields = RecipeGetSerializer.selected_fields(self.request)
+            queryset = (Recipe.objects.with_related(user, fields)
+                        .with_user_flags(user, fields))
+            if 'text' in fields:
+                return queryset.defer('search_vector')
+            return queryset.defer('search_vector', 'text')
+        return Recipe.objects.all()
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeGetSerializer
         return RecipeCreateSerializer
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        User.objects.filter(id=self.request.user.id).update(
+            recipes_count=F('recipes_count') + 1)
+        model_event(Recipe, 'created')
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        recipe_id = instance.pk
+        instance.delete()
+        recipe_index.changed(recipe_id)
+        release(instance.image.name)
+        User.objects.filter(id=instance.author_id).update(
+            recipes_count=decrement('recipes_count'))
+        model_event(Recipe, 'deleted')
 
     @action(detail=True,
             methods=['POST', 'DELETE'],
@@ -116,19 +210,124 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.post_method(ShoppingCart, request.user, pk)
         return self.delete_method(ShoppingCart, request.user, pk)
 
+    @action(detail=False,
+            methods=['POST', 'DELETE'],
+            permission_classes=[IsAuthenticated],
+            url_path='favorite',
+            url_name='favorite-batch')
+    def favorite_batch(self, request):
+        return self.batch_method(Favourite, request)
+
+    @action(detail=False,
+            methods=['POST', 'DELETE'],
+            permission_classes=[IsAuthenticated],
+            url_path='shopping_cart',
+            url_name='shopping-cart-batch')
+    def shopping_cart_batch(self, request):
+        return self.batch_method(ShoppingCart, request)
+
+    @action(detail=False,
+            methods=['GET'],
+            permission_classes=[IsAuthenticated])
+    def recommended(self, request):
+        '''Рекомендации по избранному: "вместе с этим добавляют"'''
+        queryset = recommend(self.get_queryset(), request.user)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False,
+            methods=['GET'],
+            permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        '''Лента подписок: новые рецепты авторов, на которых подписан'''
+        paginator = TimelinePagination()
+        ids = paginator.paginate_timeline(partial(timeline, request.user),
+                                          request)
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk=None):
+        '''Рецепты с похожим набором ингредиентов и тегов'''
+        recipe = get_object_or_404(Recipe, pk=pk)
+        limit = request.query_params.get('limit', '')
+        limit = min(int(limit), 50) if limit.isdigit() else 6
+        ids = similar_recipe_ids(recipe.pk, limit)
+        recipes = Recipe.objects.in_bulk(ids)
+        serializer = RecipeShowSerializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True,
+            context={'request': request})
+        return Response(serializer.data)
+
+    def batch_method(self, model, request):
+        '''Добавление или удаление списка рецептов за один запрос'''
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user = request.user
+        counter = model.counter_field
+        with transaction.atomic():
+            # Те же блокировки берут post_method и delete_method, поэтому
+            # present не меняется до конца транзакции
+            existing = set(Recipe.objects.select_for_update()
+                           .filter(id__in=ids).order_by('id')
+                           .values_list('id', flat=True))
+            rows = model.objects.filter(user=user, recipe_id__in=existing)
+            present = set(rows.values_list('recipe_id', flat=True))
+            if request.method == 'POST':
+                done, skipped, action = 'added', 'exists', 'created'
+                model.objects.bulk_create(
+                    [model(user=user, recipe_id=pk)
+                     for pk in existing - present],
+                    ignore_conflicts=True)
+                changed = set(rows.values_list('recipe_id',
+                                               flat=True)) - present
+                delta = F(counter) + 1
+            else:
+                done, skipped, action = 'removed', 'not_in_list', 'deleted'
+                changed = present
+                rows.delete()
+                delta = decrement(counter)
+            Recipe.objects.filter(id__in=changed).update(**{counter: delta})
+        model_event(model, action, len(changed))
+        results = []
+        for pk in ids:
+            if pk not in existing:
+                result = 'not_found'
+            else:
+                result = done if pk in changed else skipped
+            results.append({'id': pk, 'status': result})
+        return Response({'results': results})
+
     def post_method(self, model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
-            return Response({'errors': 'Рецепт уже в списке'},
-                            status=status.HTTP_400_BAD_REQUEST)
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
+        with transaction.atomic():
+            recipe = get_object_or_404(Recipe.objects.select_for_update(),
+                                       id=pk)
+            if model.objects.filter(user=user, recipe=recipe).exists():
+                return Response({'errors': 'Рецепт уже в списке'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            model.objects.create(user=user, recipe=recipe)
+            Recipe.objects.filter(id=pk).update(
+                **{model.counter_field: F(model.counter_field) + 1})
+        model_event(model, 'created')
         serializer = RecipeShowSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_method(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        with transaction.atomic():
+            # Блокировка рецепта, как в batch_method
+            list(Recipe.objects.select_for_update().filter(id=pk))
+            deleted, _ = model.objects.filter(user=user,
+                                              recipe__id=pk).delete()
+            if deleted:
+                Recipe.objects.filter(id=pk).update(
+                    **{model.counter_field: decrement(model.counter_field,
+                                                      deleted)})
+        if deleted:
+            model_event(model, 'deleted', deleted)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'errors': 'Рецепта нет в списке'},
                         status=status.HTTP_400_BAD_REQUEST)
@@ -137,27 +336,30 @@ class RecipeViewSet(viewsets.ModelViewSet):
             methods=['GET'],
             permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
+        exporter = EXPORTERS.get(
+            request.query_params.get('file_format', 'txt'))
+        if exporter is None:
+            return Response({'errors': 'Неизвестный формат файла'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        # Ответ читается после выхода из вьюсета, базу выбираем сразу
         ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__shopping_cart__user=request.user)
+            RecipeIngredient.objects
+            .using(router.db_for_read(RecipeIngredient))
+            .filter(recipe__shopping_cart__user=request.user)
             .values('ingredient__name', 'ingredient__measurement_unit')
             .order_by('ingredient__name')
             .annotate(amount=Sum('amount'))
         )
-        result = SHOP_LIST
-        result += '\n'.join(
-            (
-                f'{ingredient["ingredient__name"]} - {ingredient["amount"]}/'
-                f'{ingredient["ingredient__measurement_unit"]}'
-                for ingredient in ingredients
-            )
-        )
-        response = HttpResponse(result, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={FILE}'
+        response = StreamingHttpResponse(
+            exporter().render(ingredients.iterator(chunk_size=CHUNK_SIZE)),
+            content_type=exporter.content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename={FILE}.{exporter.extension}')
         return response
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, VersionedCacheMixin,
+                 viewsets.ReadOnlyModelViewSet):
     '''Вьюсет тегов'''
 
     queryset = Tag.objects.all()
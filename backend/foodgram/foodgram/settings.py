@@ -2,6 +2,8 @@ import os
 
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv('SECRET_KEY', default='django-insecure-0e2bbyehg)nz08cev&fx+adpnljr4gjawo3r&necfu&9%i)dxb')
@@ -27,6 +29,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryStatsMiddleware',
+    'api.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -36,6 +40,30 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', default='500'))
+SERVER_TIMING_HEADER = (os.getenv('SERVER_TIMING_HEADER', 'True') == 'True')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS', default='127.0.0.1,::1').split(',')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # Строка на каждый запрос пишется с уровнем INFO,
+        # медленные запросы (SLOW_REQUEST_MS) - с WARNING
+        'api': {
+            'handlers': ['console'],
+            'level': os.getenv('API_LOG_LEVEL', default='WARNING'),
+        },
+    },
+}
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -68,6 +96,54 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения, см. api.replicas.
+# Для локальной проверки на SQLite: DB_REPLICA_NAME=replica.sqlite3
+REPLICA_DATABASES = []
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD',
+                              DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES = ['replica']
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_MAX_LAG = int(os.getenv('REPLICA_MAX_LAG', default='10'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
+if REPLICA_DATABASES and not os.getenv('REDIS_URL') and not DEBUG:
+    # Закрепление пользователя за основной базой после записи хранится
+    # в кэше и должно быть видно всем воркерам
+    raise ImproperlyConfigured('Для DB_REPLICA_* нужен общий кэш REDIS_URL')
+
+REFERENCE_CACHE_ALIAS = 'default'
+REFERENCE_CACHE_TIMEOUT = 60 * 60
+# Общий для воркеров кэш токенов работает только с REDIS_URL,
+# без него токены кэшируются в процессе на TOKEN_LOCAL_CACHE_TIMEOUT
+TOKEN_CACHE_TIMEOUT = 5 * 60
+TOKEN_CACHE_SIZE = 1024
+TOKEN_LOCAL_CACHE_TIMEOUT = 5
+# Индекс ?have= получает изменения рецептов через общий кэш, а без
+# REDIS_URL перестраивается в каждом воркере раз в RECIPE_INDEX_LOCAL_TTL
+RECIPE_INDEX_TTL = 60 * 60
+RECIPE_INDEX_LOCAL_TTL = 30
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -99,6 +175,9 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+MAX_IMAGE_SIZE = 5 * 1024 * 1024
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default='2'))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
@@ -119,7 +198,16 @@ DJOSER = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomPagination',
     'PAGE_SIZE': 6,
@@ -0,0 +1,17 @@
+import os
+import shutil
+
+# Метрики Prometheus собираются из всех воркеров через общий каталог
+multiproc_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                      '/tmp/prometheus')
+
+
+def on_starting(server):
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -20,7 +20,7 @@ class IngredientAdmin(admin.ModelAdmin):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'author', 'text',
-                    'cooking_time', 'image', 'date')
+                    'cooking_time', 'image', 'date', 'favourites_count')
     search_fields = ('name', 'author', 'text', 'cooking_time')
     list_filter = ('name', 'author', 'tags')
 
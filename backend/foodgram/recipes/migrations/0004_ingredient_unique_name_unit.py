@@ -0,0 +1,51 @@
+# Generated by Django 4.2.1 on 2026-10-18 16:38
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(keep=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for group in duplicates:
+        extra = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep'])
+        recipes_with_keep = RecipeIngredient.objects.filter(
+            ingredient_id=group['keep']).values('recipe_id')
+        RecipeIngredient.objects.filter(
+            ingredient__in=extra, recipe_id__in=recipes_with_keep).delete()
+        for row in RecipeIngredient.objects.filter(ingredient__in=extra):
+            if RecipeIngredient.objects.filter(
+                    recipe_id=row.recipe_id,
+                    ingredient_id=group['keep']).exists():
+                row.delete()
+            else:
+                row.ingredient_id = group['keep']
+                row.save(update_fields=('ingredient',))
+        extra.delete()
+    # На PostgreSQL проверки внешних ключей отложены до конца транзакции,
+    # и ALTER TABLE упал бы на ожидающих триггерах. check_constraints
+    # выполняет их сразу (SET CONSTRAINTS ALL IMMEDIATE).
+    schema_editor.connection.check_constraints()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_remove_tag_colour_tag_color_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
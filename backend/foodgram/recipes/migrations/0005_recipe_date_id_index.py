@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_unique_name_unit'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-date', '-id'], name='recipe_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_signature'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_favourite_id', models.PositiveBigIntegerField(verbose_name='Последняя запись избранного')),
+                ('full', models.BooleanField(verbose_name='Полный пересчет')),
+                ('recipes', models.PositiveIntegerField(verbose_name='Пересчитано рецептов')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+            ],
+            options={
+                'verbose_name': 'Пересчет рекомендаций',
+                'verbose_name_plural': 'Пересчеты рекомендаций',
+                'ordering': ('-pk',),
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe', verbose_name='Похожий рецепт')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Соседний рецепт',
+                'verbose_name_plural': 'Соседние рецепты',
+                'indexes': [models.Index(fields=['recipe', '-score'], name='recipeneighbour_score_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipeneighbour',
+            constraint=models.UniqueConstraint(fields=('recipe', 'neighbour'), name='unique_recipe_neighbour'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.1 on 2026-10-18 17:36
+
+from django.db import migrations, models
+from django.db.models import FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def copy_scores(apps, schema_editor):
+    '''Переносит рейтинги из RecipeScore в поле рецепта'''
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeScore = apps.get_model('recipes', 'RecipeScore')
+    Recipe.objects.update(score=Coalesce(
+        Subquery(RecipeScore.objects.filter(recipe=OuterRef('pk'))
+                 .values('score')),
+        Value(0.0), output_field=FloatField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_feed_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Рейтинг популярности'),
+        ),
+        migrations.RunPython(copy_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-score', '-date', '-id'], name='recipe_score_idx'),
+        ),
+        migrations.DeleteModel(
+            name='RecipeScore',
+        ),
+    ]
@@ -1,8 +1,10 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import Exists, OuterRef, Prefetch, UniqueConstraint
 
-from users.models import User
+from recipes.storage import image_storage
+from users.models import Follow, User
 
 
 class Tag(models.Model):
@@ -38,11 +40,54 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('pk',)
+        constraints = (
+            UniqueConstraint(fields=('name', 'measurement_unit'),
+                             name='unique_ingredient'),
+        )
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    '''Выборки рецептов с постоянным числом запросов'''
+
+    def with_related(self, user=None, fields=None):
+        '''
+        Подгружает теги, автора и ингредиенты одним набором запросов.
+        Если передан fields, подгружается только то, что в нем есть.
+        '''
+        authors = User.objects.all()
+        if user is not None and user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))))
+        lookups = {
+            'tags': 'tags',
+            'author': Prefetch('author', queryset=authors),
+            'ingredients': Prefetch(
+                'recipeingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient')),
+        }
+        return self.prefetch_related(*(
+            lookup for name, lookup in lookups.items()
+            if fields is None or name in fields))
+
+    def with_user_flags(self, user, fields=None):
+        '''Аннотирует флаги is_favorited и is_in_shopping_cart'''
+        flags = {
+            'is_favorited': Favourite,
+            'is_in_shopping_cart': ShoppingCart,
+        }
+        return self.annotate(**{
+            name: (Exists(model.objects.filter(user=user,
+                                               recipe=OuterRef('pk')))
+                   if user.is_authenticated else models.Value(False))
+            for name, model in flags.items()
+            if fields is None or name in fields
+        })
+
+
 class Recipe(models.Model):
     '''Модель рецепта'''
 
@@ -53,7 +98,8 @@ class Recipe(models.Model):
     name = models.CharField(verbose_name='Название',
                             max_length=200)
     image = models.ImageField(verbose_name='Фото',
-                              upload_to='recipes/')
+                              upload_to='recipes/',
+                              storage=image_storage)
     text = models.TextField(verbose_name='Текст')
     ingredients = models.ManyToManyField(Ingredient,
                                          verbose_name='Ингредиенты',
@@ -68,16 +114,190 @@ class Recipe(models.Model):
         validators=[MinValueValidator(1, message='Минимальное значение - 1!')])
     date = models.DateTimeField(verbose_name='Дата публикации',
                                 auto_now_add=True)
+    favourites_count = models.PositiveIntegerField(
+        verbose_name='В избранном', default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок', default=0, editable=False)
+    # Пересчитывается командой refresh_scores
+    score = models.FloatField(
+        verbose_name='Рейтинг популярности', default=0, editable=False)
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый индекс', null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-date',)
+        indexes = (
+            models.Index(fields=('-date', '-id'), name='recipe_date_id_idx'),
+            models.Index(fields=('cooking_time', '-date'),
+                         name='recipe_cooking_time_idx'),
+            models.Index(fields=('-score', '-date', '-id'),
+                         name='recipe_score_idx'),
+        )
 
     def __str__(self):
         return str(self.name)
 
 
+class RecipeSignature(models.Model):
+    '''
+    MinHash-сигнатура множества ингредиентов и тегов рецепта
+    для поиска похожих рецептов. Пересчитывается при сохранении
+    рецепта и командой rebuild_similar.
+    '''
+
+    recipe = models.OneToOneField(Recipe,
+                                  verbose_name='Рецепт',
+                                  on_delete=models.CASCADE,
+                                  primary_key=True,
+                                  related_name='signature')
+    signature = models.BinaryField(verbose_name='Сигнатура')
+
+    class Meta:
+        verbose_name = 'Сигнатура рецепта'
+        verbose_name_plural = 'Сигнатуры рецептов'
+
+    def __str__(self):
+        return str(self.recipe)
+
+
+class RecipeBucket(models.Model):
+    '''Корзина LSH: хэш одной полосы сигнатуры рецепта'''
+
+    recipe = models.ForeignKey(Recipe,
+                               verbose_name='Рецепт',
+                               on_delete=models.CASCADE,
+                               related_name='buckets')
+    band = models.PositiveSmallIntegerField(verbose_name='Полоса')
+    bucket = models.BigIntegerField(verbose_name='Хэш полосы')
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        constraints = (
+            UniqueConstraint(fields=('recipe', 'band'),
+                             name='unique_recipe_band'),
+        )
+        indexes = (
+            models.Index(fields=('band', 'bucket'),
+                         name='recipebucket_band_bucket_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.recipe}: {self.band}/{self.bucket}'
+
+
+class RecipeNeighbour(models.Model):
+    '''
+    Рецепт, который часто добавляют в избранное вместе с данным.
+    Заполняется командой refresh_recommendations.
+    '''
+
+    recipe = models.ForeignKey(Recipe,
+                               verbose_name='Рецепт',
+                               on_delete=models.CASCADE,
+                               related_name='neighbours')
+    neighbour = models.ForeignKey(Recipe,
+                                  verbose_name='Похожий рецепт',
+                                  on_delete=models.CASCADE,
+                                  related_name='+')
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Соседний рецепт'
+        verbose_name_plural = 'Соседние рецепты'
+        constraints = (
+            UniqueConstraint(fields=('recipe', 'neighbour'),
+                             name='unique_recipe_neighbour'),
+        )
+        indexes = (
+            models.Index(fields=('recipe', '-score'),
+                         name='recipeneighbour_score_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} -> {self.neighbour}: {self.score:.3f}'
+
+
+class RecommendationRun(models.Model):
+    '''Запуск пересчета рекомендаций и последняя учтенная запись избранного'''
+
+    last_favourite_id = models.PositiveBigIntegerField(
+        verbose_name='Последняя запись избранного')
+    full = models.BooleanField(verbose_name='Полный пересчет')
+    recipes = models.PositiveIntegerField(verbose_name='Пересчитано рецептов')
+    created = models.DateTimeField(verbose_name='Дата',
+                                   auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Пересчет рекомендаций'
+        verbose_name_plural = 'Пересчеты рекомендаций'
+        ordering = ('-pk',)
+
+    def __str__(self):
+        return f'{self.created:%Y-%m-%d %H:%M}: {self.recipes}'
+
+
+class FeedEntry(models.Model):
+    '''
+    Рецепт в ленте подписок пользователя. Записывается при публикации
+    рецепта всем подписчикам автора и при подписке на автора.
+    '''
+
+    user = models.ForeignKey(User,
+                             verbose_name='Подписчик',
+                             on_delete=models.CASCADE,
+                             related_name='feed')
+    recipe = models.ForeignKey(Recipe,
+                               verbose_name='Рецепт',
+                               on_delete=models.CASCADE,
+                               related_name='+')
+    author = models.ForeignKey(User,
+                               verbose_name='Автор',
+                               on_delete=models.CASCADE,
+                               related_name='+')
+    date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            UniqueConstraint(fields=('user', 'recipe'),
+                             name='unique_feed_entry'),
+        )
+        indexes = (
+            models.Index(fields=('user', '-date', '-recipe'),
+                         name='feedentry_user_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='feedentry_user_author_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
+
+
+class ImageBlob(models.Model):
+    '''Счетчик ссылок рецептов на файл изображения'''
+
+    name = models.CharField(verbose_name='Файл',
+                            max_length=100,
+                            unique=True)
+    refcount = models.PositiveIntegerField(verbose_name='Ссылок',
+                                           default=0)
+    updated = models.DateTimeField(verbose_name='Изменен',
+                                   auto_now=True)
+
+    class Meta:
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
 class RecipeIngredient(models.Model):
     '''Модель ингредиентов для рецепта'''
 
@@ -107,6 +327,8 @@ class RecipeIngredient(models.Model):
 class Favourite(models.Model):
     '''Модель избранного'''
 
+    counter_field = 'favourites_count'
+
     user = models.ForeignKey(User,
                              verbose_name='Пользователь',
                              on_delete=models.CASCADE,
@@ -131,6 +353,8 @@ class Favourite(models.Model):
 class ShoppingCart(models.Model):
     '''Модель списка покупок'''
 
+    counter_field = 'in_carts_count'
+
     user = models.ForeignKey(User,
                              verbose_name='Пользователь',
                              on_delete=models.CASCADE,
@@ -0,0 +1,32 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    '''
+    Хранилище, называющее файлы по SHA-256 содержимого.
+    Повторная загрузка того же файла не создает копию.
+    '''
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        dirname = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(dirname, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения защищает файл от sweep_media,
+            # пока рецепт с ним еще не сохранен
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+
+image_storage = ContentAddressedStorage()
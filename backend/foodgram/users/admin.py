@@ -15,7 +15,8 @@ class FolowAdmin(admin.ModelAdmin):
 @admin.register(User)
 class UsersAdmin(admin.ModelAdmin):
     list_display = ('username', 'email', 'first_name',
-                    'last_name', 'password',)
+                    'last_name', 'password', 'recipes_count',
+                    'followers_count',)
     search_fields = ('username', 'email',)
     list_filter = ('username', 'email',)
     empty_value = EMPTY_VALUE
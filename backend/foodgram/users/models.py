@@ -23,6 +23,10 @@ class User(AbstractUser):
                                  max_length=150)
     password = models.CharField(verbose_name='Пароль',
                                 max_length=150)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков', default=0, editable=False)
 
     class Meta:
         verbose_name = 'Пользователь'